@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def gemini_model():
+    """Gemini model configured once and shared by every live test in the session"""
+    # Imported here so root-level runs that never ask for this fixture don't
+    # load the script, dotenv or the Gemini SDK
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+    from test_gemini import MODEL_NAME, SERVER_DIR
+    # Read GEMINI_API_KEY from server/.env; variables already set in the shell win
+    load_dotenv(os.path.join(SERVER_DIR, ".env"))
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(MODEL_NAME)
@@ -1,28 +1,48 @@
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.exc import SQLAlchemyError
 from contextlib import asynccontextmanager
+import logging
 import uvicorn
 
 from app.routes import intake, patients, auth, analytics
-from app.models.database import engine, Base
+from app.models.database import async_engine, Base
 from app.utils.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create database tables
-    Base.metadata.create_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
     yield
+    await async_engine.dispose()
 
 app = FastAPI(
     title="MedQ API",
     description="AI-Powered Medical Intake Assistant API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip responses except PDF exports, which are already compressed"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/export/pdf"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress JSON/CSV bodies; a moderate level keeps the CPU cost per response low
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +55,13 @@ app.add_middleware(
 # Security
 security = HTTPBearer()
 
+# Database errors are logged server-side; the statement and parameters are
+# never echoed back to the client
+@app.exception_handler(SQLAlchemyError)
+async def database_error_handler(request, exc: SQLAlchemyError):
+    logger.error("Database error on %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse(status_code=500, content={"detail": "Database error"})
+
 # Include routers
 app.include_router(intake.router, prefix="/api/intake", tags=["intake"])
 app.include_router(patients.router, prefix="/api/patients", tags=["patients"])
@@ -50,9 +77,16 @@ async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
 if __name__ == "__main__":
+    development = settings.environment == "development"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=development,
+        # uvicorn ignores workers when reloading. Each worker keeps its own
+        # in-process caches (dashboard, users, PDFs), which may briefly disagree
+        workers=None if development else settings.web_concurrency,
+        loop="uvloop",
+        http="httptools",
+        access_log=development
     )
@@ -1,20 +1,93 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean
+import logging
+from typing import AsyncGenerator
+from sqlalchemy import make_url, Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.sql import func
 from app.utils.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# asyncio drivers used in place of the sync ones from DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """Rewrite a sync database URL to use the matching asyncio driver"""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+def get_pool_limits() -> tuple:
+    """Per-worker pool size and overflow that keep every worker together
+    within db_max_connections"""
+    workers = max(1, settings.web_concurrency)
+    # Every worker needs at least one connection, even past the budget
+    per_worker = max(1, settings.db_max_connections // workers)
+    pool_size = settings.db_pool_size or max(1, per_worker // 2)
+    max_overflow = settings.db_max_overflow
+    if max_overflow is None:
+        max_overflow = max(0, per_worker - pool_size)
+    total = (pool_size + max_overflow) * workers
+    if total > settings.db_max_connections:
+        logger.warning(
+            "%d workers may open up to %d database connections, over DB_MAX_CONNECTIONS=%d; "
+            "lower WEB_CONCURRENCY or the pool settings",
+            workers, total, settings.db_max_connections,
+        )
+    return pool_size, max_overflow
+
+def get_engine_options(database_url: str) -> dict:
+    """Connection pool settings for the async engine"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        # aiosqlite defaults to NullPool, which opens a new connection per
+        # session; keep file-backed connections pooled instead
+        if url.database not in (None, "", ":memory:"):
+            options["poolclass"] = AsyncAdaptedQueuePool
+        return options
+    # asyncpg keeps server-side prepared statements per connection, so the
+    # fixed-shape auth and patient lookups are planned once and reused.
+    # Both caches must be 0 when PgBouncer pools in transaction mode.
+    cache_size = settings.db_statement_cache_size
+    pool_size, max_overflow = get_pool_limits()
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_use_lifo": True,
+        "connect_args": {
+            "prepared_statement_cache_size": cache_size,
+            "statement_cache_size": cache_size,
+        },
+    }
 
-# Database setup
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+# The only engine: request handlers and the startup create_all both use it,
+# so each worker holds a single connection pool
+async_engine = create_async_engine(
+    get_async_database_url(settings.database_url),
+    **get_engine_options(settings.database_url)
+)
+# Objects stay readable after commit; handlers serialize them straight away,
+# so expiring them would only cost a refresh SELECT
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Dependency to get an async database session
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# Dependency for handlers whose work outlives the request, such as streamed
+# responses, and must open their own session
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return AsyncSessionLocal
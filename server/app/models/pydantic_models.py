@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -42,8 +42,7 @@ class PatientResponse(PatientBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 # Intake Schemas
 class IntakeData(BaseModel):
@@ -64,9 +63,13 @@ class TextProcessResponse(BaseModel):
     response: str
     extracted_data: Dict[str, Any]
     next_step: str
+    
+    model_config = ConfigDict(frozen=True)
 
 class VoiceTranscriptResponse(BaseModel):
     transcript: str
+    
+    model_config = ConfigDict(frozen=True)
 
 # Medical Summary Schemas
 class StructuredData(BaseModel):
@@ -93,8 +96,7 @@ class MedicalSummaryResponse(MedicalSummaryBase):
     patient_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 # Auth Schemas
 class UserBase(BaseModel):
@@ -109,12 +111,13 @@ class UserResponse(UserBase):
     role: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    
+    model_config = ConfigDict(frozen=True)
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -130,6 +133,8 @@ class DashboardStats(BaseModel):
     avg_consultation_time: float
     top_symptoms: List[Dict[str, Any]]
     patients_by_date: List[Dict[str, Any]]
+    
+    model_config = ConfigDict(frozen=True)
 
 # API Response Wrapper
 class APIResponse(BaseModel):
@@ -137,3 +142,9 @@ class APIResponse(BaseModel):
     data: Optional[Any] = None
     message: Optional[str] = None
     error: Optional[str] = None
+    
+    model_config = ConfigDict(frozen=True)
+
+class PaginatedAPIResponse(APIResponse):
+    # Last id on a full page; pass it back as after_id. None on the last page
+    next_cursor: Optional[int] = None
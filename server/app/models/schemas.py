@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Index
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from app.models.database import Base
 
@@ -14,11 +14,12 @@ class Patient(Base):
     duration = Column(String, nullable=False)
     allergies = Column(Text, nullable=True)
     medications = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationships
-    summaries = relationship("MedicalSummary", back_populates="patient")
+    # Relationships - lazy loading is disabled so an implicit N+1 (or a sync
+    # load under AsyncSession) fails loudly; use selectinload() in the query
+    summaries = relationship("MedicalSummary", back_populates="patient", lazy="raise")
 
 class MedicalSummary(Base):
     __tablename__ = "summaries"
@@ -28,10 +29,15 @@ class MedicalSummary(Base):
     summary_text = Column(Text, nullable=False)
     structured_data = Column(JSON, nullable=True)
     icd_codes = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Relationships
-    patient = relationship("Patient", back_populates="summaries")
+    patient = relationship("Patient", back_populates="summaries", lazy="raise")
+    
+    # Serves the "latest summary for a patient" lookup as a single index probe
+    __table_args__ = (
+        Index("ix_summaries_patient_created", patient_id, created_at.desc()),
+    )
 
 class DoctorUser(Base):
     __tablename__ = "doctors"
@@ -42,3 +48,22 @@ class DoctorUser(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, default="doctor")  # doctor or admin
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Login compares lower(username), which also matches mixed-case names
+    # stored before usernames were normalised
+    __table_args__ = (
+        Index("ix_doctors_username_lower", func.lower(username)),
+    )
+    
+    @validates("username")
+    def normalize_username(self, key, username):
+        # New usernames are stored lowercased
+        return username.lower()
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    # Shared by every worker, so a logout holds no matter which one serves
+    # the next request; rows are purged once the token would have expired
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # naive UTC
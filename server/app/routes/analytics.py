@@ -1,66 +1,106 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import select, func, desc, case
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 import csv
 import io
+import logging
+import re
+from collections import Counter, defaultdict
+from cachetools import TTLCache
 from fastapi.responses import StreamingResponse
 
-from app.models.database import get_db
+from app.models.database import get_async_db, get_async_sessionmaker
 from app.models.schemas import Patient, MedicalSummary
 from app.models.pydantic_models import DashboardStats, APIResponse
 from app.routes.auth import get_current_user
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+_COMMON_SYMPTOMS = ('headache', 'fever', 'cough', 'pain', 'nausea', 'fatigue', 'dizziness')
+
+# Single compiled alternation so each symptoms blob is scanned once in C
+# instead of once per keyword
+_SYMPTOM_PATTERN = re.compile("|".join(_COMMON_SYMPTOMS))
+
+# Dashboard stats only change when a patient is added, so they are kept for a
+# short while instead of being re-aggregated on every poll
+_dashboard_cache = TTLCache(maxsize=1, ttl=30)
+
+def invalidate_dashboard_cache():
+    """Drop cached dashboard stats so the next request re-aggregates them"""
+    _dashboard_cache.clear()
 
 @router.get("/dashboard", response_model=APIResponse)
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     """Get dashboard analytics and statistics"""
+    cached_stats = _dashboard_cache.get("stats")
+    if cached_stats is not None:
+        return APIResponse(
+            success=True,
+            data=cached_stats,
+            message="Dashboard statistics retrieved successfully"
+        )
+    
     try:
         # Total patients
-        total_patients = db.query(Patient).count()
+        total_patients = await db.scalar(select(func.count(Patient.id)))
         
         # Today's patients
+        # Half-open range on the raw column so the created_at index is usable
         today = datetime.now().date()
-        today_patients = db.query(Patient).filter(
-            func.date(Patient.created_at) == today
-        ).count()
+        today_start = datetime.combine(today, time.min)
+        today_patients = await db.scalar(
+            select(func.count(Patient.id)).where(
+                Patient.created_at >= today_start,
+                Patient.created_at < today_start + timedelta(days=1)
+            )
+        )
         
         # Average consultation time (mock data for now)
         avg_consultation_time = 25.5  # minutes
         
-        # Top symptoms (analyze symptoms text)
-        symptoms_query = db.query(Patient.symptoms).all()
-        symptom_counts = {}
-        
-        for (symptoms_text,) in symptoms_query:
-            if symptoms_text:
-                # Simple keyword extraction (in production, use more sophisticated NLP)
-                words = symptoms_text.lower().split()
-                common_symptoms = ['headache', 'fever', 'cough', 'pain', 'nausea', 'fatigue', 'dizziness']
-                for symptom in common_symptoms:
-                    if symptom in ' '.join(words):
-                        symptom_counts[symptom] = symptom_counts.get(symptom, 0) + 1
+        # Top symptoms - counted in a single aggregate so only one integer per
+        # keyword comes back instead of every symptoms blob
+        symptom_result = await db.execute(select(*[
+            func.sum(case((Patient.symptoms.ilike(f"%{symptom}%"), 1), else_=0)).label(symptom)
+            for symptom in _COMMON_SYMPTOMS
+        ]))
+        symptom_row = symptom_result.one()
+        symptom_counts = {
+            symptom: count
+            for symptom, count in zip(_COMMON_SYMPTOMS, symptom_row)
+            if count
+        }
         
         top_symptoms = [
             {"symptom": symptom, "count": count} 
             for symptom, count in sorted(symptom_counts.items(), key=lambda x: x[1], reverse=True)[:5]
         ]
         
-        # Patients by date (last 7 days)
+        # Patients by date (last 7 days) - one grouped query, missing days padded
+        week_start = today - timedelta(days=6)
+        day_bucket = func.date(Patient.created_at)
+        # SQLite returns the bucket as text while Postgres returns a date, so
+        # key on the ISO string for both
+        date_result = await db.execute(
+            select(day_bucket, func.count(Patient.id)).where(
+                Patient.created_at >= datetime.combine(week_start, time.min)
+            ).group_by(day_bucket)
+        )
+        counts_by_date = {str(day): count for day, count in date_result.all()}
         patients_by_date = []
         for i in range(7):
-            date = (datetime.now() - timedelta(days=i)).date()
-            count = db.query(Patient).filter(
-                func.date(Patient.created_at) == date
-            ).count()
+            day = (today - timedelta(days=i)).isoformat()
             patients_by_date.append({
-                "date": date.isoformat(),
-                "count": count
+                "date": day,
+                "count": counts_by_date.get(day, 0)
             })
         
         stats = DashboardStats(
@@ -71,9 +111,11 @@ async def get_dashboard_stats(
             patients_by_date=list(reversed(patients_by_date))
         )
         
+        _dashboard_cache["stats"] = stats.model_dump()
+        
         return APIResponse(
             success=True,
-            data=stats.dict(),
+            data=_dashboard_cache["stats"],
             message="Dashboard statistics retrieved successfully"
         )
     
@@ -82,54 +124,64 @@ async def get_dashboard_stats(
 
 @router.get("/export")
 async def export_analytics_csv(
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
+    start_date: Optional[date] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="End date (YYYY-MM-DD)"),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_sessionmaker),
     current_user = Depends(get_current_user)
 ):
     """Export analytics data as CSV"""
     try:
         # Build query
-        query = db.query(Patient)
+        query = select(Patient)
         
         if start_date:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            query = query.filter(Patient.created_at >= start_dt)
+            query = query.where(Patient.created_at >= datetime.combine(start_date, time.min))
         
         if end_date:
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-            query = query.filter(Patient.created_at <= end_dt)
-        
-        patients = query.all()
-        
-        # Create CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Header
-        writer.writerow([
-            "ID", "Name", "Age", "Gender", "Symptoms", "Duration",
-            "Medications", "Allergies", "Created At"
-        ])
-        
-        # Data rows
-        for patient in patients:
+            query = query.where(Patient.created_at <= datetime.combine(end_date, time.min))
+        
+        async def iter_csv():
+            # One small buffer is reused for every row so memory stays flat
+            # no matter how many patients are exported
+            output = io.StringIO()
+            writer = csv.writer(output)
+            
+            # Header
             writer.writerow([
-                patient.id,
-                patient.name,
-                patient.age,
-                patient.gender,
-                patient.symptoms[:100] + "..." if len(patient.symptoms) > 100 else patient.symptoms,
-                patient.duration,
-                patient.medications or "None",
-                patient.allergies or "None",
-                patient.created_at.strftime("%Y-%m-%d %H:%M:%S")
+                "ID", "Name", "Age", "Gender", "Symptoms", "Duration",
+                "Medications", "Allergies", "Created At"
             ])
-        
-        output.seek(0)
+            yield output.getvalue().encode()
+            
+            # Data rows, read on a session owned by the stream: the request's
+            # session may already be closed once the response starts sending
+            async with session_factory() as db:
+                try:
+                    patients = await db.stream_scalars(query.execution_options(yield_per=1000))
+                    async for patient in patients:
+                        output.seek(0)
+                        output.truncate(0)
+                        writer.writerow([
+                            patient.id,
+                            patient.name,
+                            patient.age,
+                            patient.gender,
+                            patient.symptoms[:100] + "..." if len(patient.symptoms) > 100 else patient.symptoms,
+                            patient.duration,
+                            patient.medications or "None",
+                            patient.allergies or "None",
+                            patient.created_at.strftime("%Y-%m-%d %H:%M:%S")
+                        ])
+                        yield output.getvalue().encode()
+                except SQLAlchemyError:
+                    # Headers are already sent, so the status can't change;
+                    # log and abort the transfer rather than end a truncated
+                    # file as if it were complete
+                    logger.exception("CSV export failed mid-stream")
+                    raise
         
         return StreamingResponse(
-            io.BytesIO(output.getvalue().encode()),
+            iter_csv(),
             media_type="text/csv",
             headers={
                 "Content-Disposition": f"attachment; filename=medq_analytics_{datetime.now().strftime('%Y%m%d')}.csv"
@@ -142,7 +194,7 @@ async def export_analytics_csv(
 @router.get("/symptoms/trends")
 async def get_symptom_trends(
     days: int = Query(30, ge=1, le=365, description="Number of days to analyze"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     """Get symptom trends over time"""
@@ -150,26 +202,18 @@ async def get_symptom_trends(
         start_date = datetime.now() - timedelta(days=days)
         
         # Get patients from the specified period
-        patients = db.query(Patient).filter(
-            Patient.created_at >= start_date
-        ).all()
+        result = await db.execute(
+            select(Patient).where(Patient.created_at >= start_date)
+        )
+        patients = result.scalars().all()
         
         # Analyze symptoms by day
-        symptom_trends = {}
-        common_symptoms = ['headache', 'fever', 'cough', 'pain', 'nausea', 'fatigue', 'dizziness']
+        symptom_trends = defaultdict(Counter)
         
         for patient in patients:
             if patient.symptoms:
                 date_key = patient.created_at.date().isoformat()
-                if date_key not in symptom_trends:
-                    symptom_trends[date_key] = {}
-                
-                symptoms_text = patient.symptoms.lower()
-                for symptom in common_symptoms:
-                    if symptom in symptoms_text:
-                        if symptom not in symptom_trends[date_key]:
-                            symptom_trends[date_key][symptom] = 0
-                        symptom_trends[date_key][symptom] += 1
+                symptom_trends[date_key].update(set(_SYMPTOM_PATTERN.findall(patient.symptoms.lower())))
         
         return APIResponse(
             success=True,
@@ -1,13 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+import time
+import uuid
 import jwt
+from cachetools import TTLCache
 from passlib.context import CryptContext
 
-from app.models.database import get_db
-from app.models.schemas import DoctorUser
+from app.models.database import get_async_db
+from app.models.schemas import DoctorUser, RevokedToken
 from app.models.pydantic_models import (
     LoginRequest, Token, UserResponse, APIResponse
 )
@@ -15,9 +20,24 @@ from app.utils.config import get_settings
 
 router = APIRouter()
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 settings = get_settings()
 
+# JWT settings bound once for the encode/decode hot path
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ALGORITHMS = [ALGORITHM]
+ACCESS_TOKEN_EXPIRE = timedelta(minutes=settings.access_token_expire_minutes)
+
+# Decoded tokens and user rows are cached briefly so polling clients don't pay
+# for a signature check and a DB round-trip on every request
+_token_cache = TTLCache(maxsize=2048, ttl=60)  # token -> (username, exp, jti)
+_user_cache = TTLCache(maxsize=1024, ttl=30)  # username -> detached DoctorUser
+# jtis recently checked and found not revoked. A logout on this worker takes
+# effect at once; one on another worker takes effect within the TTL
+_unrevoked_cache = TTLCache(maxsize=2048, ttl=10)  # jti -> True
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -33,54 +53,91 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    # jti keeps tokens issued in the same second distinct, so revoking one on
+    # logout can't revoke a fresh login
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(
+def _user_to_response(user: DoctorUser) -> UserResponse:
+    """Build a UserResponse from a DoctorUser row without re-validating it.
+
+    The fields come straight from the database, not from request input, so
+    skipping pydantic validation here is safe.
+    """
+    return UserResponse.model_construct(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        role=user.role,
+        created_at=user.created_at
+    )
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> DoctorUser:
     """Get current authenticated user"""
-    try:
-        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
-        username: str = payload.get("sub")
-        if username is None:
+    token = credentials.credentials
+    cached_token = _token_cache.get(token)
+    if cached_token is None or cached_token[1] <= time.time():
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHMS)
+            username: str = payload.get("sub")
+            if username is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        except jwt.PyJWTError:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        cached_token = _token_cache[token] = (username, payload.get("exp", 0), payload.get("jti"))
+    username, _, jti = cached_token
     
-    user = db.query(DoctorUser).filter(DoctorUser.username == username).first()
+    # Revocations live in the database so a logout on one worker is seen by all
+    if jti and jti not in _unrevoked_cache:
+        if await db.scalar(select(RevokedToken.jti).where(RevokedToken.jti == jti)):
+            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        _unrevoked_cache[jti] = True
+    
+    user = _user_cache.get(username)
     if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
+        result = await db.execute(select(DoctorUser).where(DoctorUser.username == username))
+        user = result.scalar_one_or_none()
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        # Detach so the cached row is never expired or reused by a later session
+        db.expunge(user)
+        _user_cache[username] = user
     return user
 
 @router.post("/login", response_model=APIResponse)
 async def login(
     login_data: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Authenticate user and return access token"""
     try:
         # Find user
-        user = db.query(DoctorUser).filter(
-            DoctorUser.username == login_data.username
-        ).first()
+        result = await db.execute(
+            select(DoctorUser).where(func.lower(DoctorUser.username) == login_data.username.lower())
+        )
+        user = result.scalar_one_or_none()
         
-        if not user or not verify_password(login_data.password, user.hashed_password):
+        # bcrypt is deliberately slow, so verify in a worker thread to keep
+        # the event loop free for other requests
+        if not user or not await asyncio.to_thread(
+            verify_password, login_data.password, user.hashed_password
+        ):
             raise HTTPException(status_code=401, detail="Incorrect username or password")
         
         # Create access token
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
         access_token = create_access_token(
-            data={"sub": user.username}, expires_delta=access_token_expires
+            data={"sub": user.username}, expires_delta=ACCESS_TOKEN_EXPIRE
         )
         
         return APIResponse(
             success=True,
             data={
                 "token": access_token,
-                "user": UserResponse.from_orm(user)
+                "user": _user_to_response(user)
             },
             message="Login successful"
         )
@@ -97,21 +154,22 @@ async def get_current_user_info(
     """Get current user information"""
     return APIResponse(
         success=True,
-        data=UserResponse.from_orm(current_user),
+        data=_user_to_response(current_user),
         message="User information retrieved"
     )
 
 @router.post("/create-admin")
-async def create_admin_user(db: Session = Depends(get_db)):
+async def create_admin_user(db: AsyncSession = Depends(get_async_db)):
     """Create default admin user (for development only)"""
     if settings.environment != "development":
         raise HTTPException(status_code=403, detail="Only available in development mode")
     
     try:
         # Check if admin already exists
-        existing_admin = db.query(DoctorUser).filter(
-            DoctorUser.username == "admin"
-        ).first()
+        result = await db.execute(
+            select(DoctorUser).where(DoctorUser.username == "admin")
+        )
+        existing_admin = result.scalar_one_or_none()
         
         if existing_admin:
             return {"message": "Admin user already exists"}
@@ -120,17 +178,17 @@ async def create_admin_user(db: Session = Depends(get_db)):
         admin_user = DoctorUser(
             username="admin",
             email="admin@medq.com",
-            hashed_password=get_password_hash("admin123"),
+            hashed_password=await asyncio.to_thread(get_password_hash, "admin123"),
             role="admin"
         )
         
         db.add(admin_user)
-        db.commit()
+        await db.commit()
         
         return {"message": "Admin user created successfully", "username": "admin", "password": "admin123"}
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating admin user: {str(e)}")
 
 @router.post("/refresh", response_model=APIResponse)
@@ -139,9 +197,8 @@ async def refresh_token(
 ):
     """Refresh access token for current user"""
     try:
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
         access_token = create_access_token(
-            data={"sub": current_user.username}, expires_delta=access_token_expires
+            data={"sub": current_user.username}, expires_delta=ACCESS_TOKEN_EXPIRE
         )
         
         return APIResponse(
@@ -154,8 +211,32 @@ async def refresh_token(
         raise HTTPException(status_code=500, detail=f"Token refresh error: {str(e)}")
 
 @router.post("/logout", response_model=APIResponse)
-async def logout():
-    """Logout user (client-side token removal)"""
+async def logout(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Logout user and revoke the presented token"""
+    payload = None
+    if credentials:
+        try:
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=ALGORITHMS)
+        except jwt.PyJWTError:
+            # Forged or expired tokens are rejected anyway; storing them would
+            # only let anonymous callers grow the denylist
+            pass
+    
+    if payload and payload.get("jti"):
+        now = datetime.utcnow()
+        async with db.begin():
+            await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            if await db.get(RevokedToken, payload["jti"]) is None:
+                db.add(RevokedToken(
+                    jti=payload["jti"],
+                    expires_at=datetime.utcfromtimestamp(payload["exp"])
+                ))
+        _token_cache.pop(credentials.credentials, None)
+        _unrevoked_cache.pop(payload["jti"], None)
+    
     return APIResponse(
         success=True,
         message="Logged out successfully"
@@ -168,6 +249,6 @@ async def verify_token(
     """Verify if the current token is valid"""
     return APIResponse(
         success=True,
-        data=UserResponse.from_orm(current_user),
+        data=_user_to_response(current_user),
         message="Token is valid"
     )
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any
+from functools import lru_cache
 
-from app.models.database import get_db
+from app.models.database import get_async_db
 from app.models.pydantic_models import (
     TextProcessRequest, TextProcessResponse, VoiceTranscriptResponse,
     IntakeData, APIResponse
@@ -24,22 +25,32 @@ class MedicalConversationResponse(BaseModel):
 
 router = APIRouter()
 
+# The services hold SDK clients that are costly to build, so each is created
+# once per process on first use and shared by every request
+@lru_cache(maxsize=1)
+def get_ai_service() -> AIService:
+    return AIService()
+
+@lru_cache(maxsize=1)
+def get_voice_service() -> VoiceService:
+    return VoiceService()
+
 @router.post("/voice", response_model=APIResponse)
 async def process_voice(
     audio: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Process voice input and return transcript"""
     try:
         if not audio.content_type or not audio.content_type.startswith('audio/'):
             raise HTTPException(status_code=400, detail="File must be an audio file")
         
-        # Read audio file
-        audio_data = await audio.read()
-        
-        # Transcribe using OpenAI Whisper
-        voice_service = VoiceService()
-        transcript = await voice_service.transcribe_audio(audio_data)
+        # Transcribe using OpenAI Whisper, passing the spooled upload through
+        # rather than reading it all into memory first
+        voice_service = get_voice_service()
+        transcript = await voice_service.transcribe_audio(
+            audio.file, filename=audio.filename or "audio.wav"
+        )
         
         return APIResponse(
             success=True,
@@ -53,11 +64,11 @@ async def process_voice(
 @router.post("/text", response_model=APIResponse)
 async def process_text(
     request: TextProcessRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Process text input and extract medical information"""
     try:
-        ai_service = AIService()
+        ai_service = get_ai_service()
         
         # Process the message and extract data
         response_data = await ai_service.process_intake_message(
@@ -77,11 +88,11 @@ async def process_text(
 @router.post("/summarize", response_model=APIResponse)
 async def generate_summary(
     intake_data: IntakeData,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Generate AI medical summary from intake data"""
     try:
-        ai_service = AIService()
+        ai_service = get_ai_service()
         
         # Generate comprehensive medical summary
         summary = await ai_service.generate_medical_summary(intake_data)
@@ -98,7 +109,7 @@ async def generate_summary(
 @router.post("/medical-chat", response_model=APIResponse)
 async def medical_conversation(
     request: MedicalConversationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Handle intelligent medical conversation using the compassionate AI assistant.
@@ -110,7 +121,7 @@ async def medical_conversation(
     - Handles emergency situations appropriately
     """
     try:
-        ai_service = AIService()
+        ai_service = get_ai_service()
         
         # Process the medical conversation
         response_data = await ai_service.intelligent_medical_conversation(
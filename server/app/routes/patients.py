@@ -1,196 +1,283 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter
+from typing import TYPE_CHECKING, List, Optional
+import asyncio
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from fastapi.responses import StreamingResponse
+import textwrap
+from itertools import chain
+from cachetools import LRUCache
 
-from app.models.database import get_db
+from app.models.database import get_async_db
 from app.models.schemas import Patient, MedicalSummary
 from app.models.pydantic_models import (
-    PatientCreate, PatientResponse, MedicalSummaryResponse, APIResponse
+    PatientCreate, PatientResponse, MedicalSummaryResponse, APIResponse, PaginatedAPIResponse
 )
+from app.routes.analytics import invalidate_dashboard_cache
+
+if TYPE_CHECKING:
+    from reportlab.pdfgen.canvas import Canvas
 
 router = APIRouter()
 
-@router.get("/", response_model=APIResponse)
+# Built once per worker; list pages validate every row in a single adapter call
+_PATIENT_ADAPTER = TypeAdapter(PatientResponse)
+_PATIENTS_ADAPTER = TypeAdapter(List[PatientResponse])
+_SUMMARY_ADAPTER = TypeAdapter(MedicalSummaryResponse)
+
+# A single outer join beats gathering two SELECTs on separate connections:
+# one round-trip instead of two overlapped ones, and no second pool checkout
+async def _get_patient_with_latest_summary(db: AsyncSession, patient_id: int):
+    """Fetch a patient and its most recent summary (or None) in one query"""
+    result = await db.execute(
+        select(Patient, MedicalSummary)
+        .outerjoin(MedicalSummary, MedicalSummary.patient_id == Patient.id)
+        .where(Patient.id == patient_id)
+        .order_by(MedicalSummary.created_at.desc())
+        .limit(1)
+    )
+    row = result.first()
+    return (row[0], row[1]) if row else (None, None)
+
+# Patient records change rarely, so let clients revalidate instead of re-fetching
+CACHE_CONTROL = "private, max-age=30, stale-while-revalidate=60"
+
+def _etag(record_id: int, changed_at) -> str:
+    """Cheap weak ETag from a row id and its last-change timestamp"""
+    stamp = int(changed_at.timestamp()) if changed_at else 0
+    return f'W/"{record_id}-{stamp}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client already holds the representation tagged etag"""
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set caching headers; return a 304 if the client's copy is still current"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    response.headers.update(headers)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return None
+
+@router.get("/", response_model=PaginatedAPIResponse)
 async def get_patients(
-    skip: int = Query(0, ge=0),
+    after_id: Optional[int] = Query(None, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all patients with pagination"""
-    try:
-        patients = db.query(Patient).offset(skip).limit(limit).all()
-        patients_data = [PatientResponse.from_orm(patient) for patient in patients]
-        
-        return APIResponse(
-            success=True,
-            data=patients_data,
-            message=f"Retrieved {len(patients_data)} patients"
-        )
+    """Get all patients with keyset pagination on id"""
+    query = select(Patient).order_by(Patient.id).limit(limit)
+    if after_id is not None:
+        query = query.where(Patient.id > after_id)
+    result = await db.execute(query)
+    patients_data = _PATIENTS_ADAPTER.validate_python(result.scalars().all(), from_attributes=True)
+    
+    # A short page means there is nothing left to fetch
+    next_cursor = patients_data[-1].id if len(patients_data) == limit else None
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving patients: {str(e)}")
+    return PaginatedAPIResponse(
+        success=True,
+        data=patients_data,
+        message=f"Retrieved {len(patients_data)} patients",
+        next_cursor=next_cursor
+    )
 
 @router.get("/{patient_id}", response_model=APIResponse)
 async def get_patient(
     patient_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific patient by ID"""
-    try:
-        patient = db.query(Patient).filter(Patient.id == patient_id).first()
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        return APIResponse(
-            success=True,
-            data=PatientResponse.from_orm(patient),
-            message="Patient retrieved successfully"
-        )
+    result = await db.execute(select(Patient).where(Patient.id == patient_id))
+    patient = result.scalar_one_or_none()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    etag = _etag(patient.id, patient.updated_at or patient.created_at)
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving patient: {str(e)}")
+    return APIResponse(
+        success=True,
+        data=_PATIENT_ADAPTER.validate_python(patient, from_attributes=True),
+        message="Patient retrieved successfully"
+    )
 
 @router.post("/", response_model=APIResponse)
 async def create_patient(
     patient_data: PatientCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new patient record"""
-    try:
-        # Create new patient
-        db_patient = Patient(**patient_data.dict())
-        db.add(db_patient)
-        db.commit()
-        db.refresh(db_patient)
-        
-        return APIResponse(
-            success=True,
-            data=PatientResponse.from_orm(db_patient),
-            message="Patient created successfully"
+    # Create new patient with a Core INSERT ... RETURNING, skipping the unit of
+    # work; the transaction rolls back on its own if the insert fails
+    async with db.begin():
+        db_patient = await db.scalar(
+            insert(Patient).values(**patient_data.model_dump()).returning(Patient)
         )
+    invalidate_dashboard_cache()
     
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error creating patient: {str(e)}")
+    return APIResponse(
+        success=True,
+        data=_PATIENT_ADAPTER.validate_python(db_patient, from_attributes=True),
+        message="Patient created successfully"
+    )
 
 @router.get("/{patient_id}/summary", response_model=APIResponse)
 async def get_patient_summary(
     patient_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get medical summary for a specific patient"""
-    try:
-        # Check if patient exists
-        patient = db.query(Patient).filter(Patient.id == patient_id).first()
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        # Get the latest summary
-        summary = db.query(MedicalSummary).filter(
-            MedicalSummary.patient_id == patient_id
-        ).order_by(MedicalSummary.created_at.desc()).first()
-        
-        if not summary:
-            raise HTTPException(status_code=404, detail="No summary found for this patient")
-        
-        return APIResponse(
-            success=True,
-            data=MedicalSummaryResponse.from_orm(summary),
-            message="Summary retrieved successfully"
-        )
+    # Only the summary is returned, so the patient side of the join is just its id
+    result = await db.execute(
+        select(Patient.id, MedicalSummary)
+        .outerjoin(MedicalSummary, MedicalSummary.patient_id == Patient.id)
+        .where(Patient.id == patient_id)
+        .order_by(MedicalSummary.created_at.desc())
+        .limit(1)
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    summary = row[1]
+    if not summary:
+        raise HTTPException(status_code=404, detail="No summary found for this patient")
+    
+    etag = _etag(summary.id, summary.created_at)
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+    
+    return APIResponse(
+        success=True,
+        data=_SUMMARY_ADAPTER.validate_python(summary, from_attributes=True),
+        message="Summary retrieved successfully"
+    )
+
+# PDF layout constants, computed once at import
+PAGE_WIDTH, PAGE_HEIGHT = 612.0, 792.0  # US Letter in points, as reportlab's letter
+PDF_MARGIN = 50
+PDF_TOP = PAGE_HEIGHT - PDF_MARGIN  # baseline of the first line on a page
+PDF_BOTTOM = 100
+PDF_TITLE = "MedQ - Medical Summary Report"
+TITLE_FONT = ("Helvetica-Bold", 16)
+HEADING_FONT = ("Helvetica-Bold", 12)
+BODY_FONT = ("Helvetica", 10)
+PDF_LEADING = 15
+PDF_LINE_WIDTH = 80
+
+# Rendered reports keyed by (patient_id, patient version, summary id)
+_pdf_cache = LRUCache(maxsize=128)
+PDF_CACHE_CONTROL = "private, max-age=60, stale-while-revalidate=300"
+
+def _wrap_lines(body: str) -> List[str]:
+    """Split text into lines wrapped to the page width, keeping blank lines"""
+    return list(chain.from_iterable(
+        textwrap.wrap(line, PDF_LINE_WIDTH) or [""] for line in body.splitlines()
+    ))
+
+def _draw_text_block(p: "Canvas", body: str, y_position: float) -> float:
+    """Draw wrapped body text as text objects, breaking pages as needed"""
+    text = p.beginText(PDF_MARGIN, y_position)
+    text.setFont(*BODY_FONT)
+    text.setLeading(PDF_LEADING)
+    for line in _wrap_lines(body):
+        if text.getY() < PDF_BOTTOM:  # Start new page if needed
+            p.drawText(text)
+            p.showPage()
+            text = p.beginText(PDF_MARGIN, PDF_TOP)
+            text.setFont(*BODY_FONT)
+            text.setLeading(PDF_LEADING)
+        text.textLine(line)
+    p.drawText(text)
+    return text.getY()
+
+def _render_pdf(patient: Patient, summary: Optional[MedicalSummary]) -> bytes:
+    """Draw the patient report with reportlab and return the PDF bytes"""
+    # reportlab is heavy and only this endpoint needs it, so it is imported on
+    # first export rather than at worker startup
+    from reportlab.pdfgen import canvas
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving summary: {str(e)}")
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+
+    # Header
+    p.setFont(*TITLE_FONT)
+    p.drawString(PDF_MARGIN, PDF_TOP, PDF_TITLE)
+
+    # Patient Info
+    y_position = PDF_TOP - 50
+    p.setFont(*HEADING_FONT)
+    p.drawString(PDF_MARGIN, y_position, "Patient Information:")
+
+    y_position -= 30
+    p.setFont(*BODY_FONT)
+    p.drawString(PDF_MARGIN, y_position, f"Name: {patient.name}")
+    y_position -= 20
+    p.drawString(PDF_MARGIN, y_position, f"Age: {patient.age}")
+    y_position -= 20
+    p.drawString(PDF_MARGIN, y_position, f"Gender: {patient.gender}")
+    y_position -= 20
+    p.drawString(PDF_MARGIN, y_position, f"Date: {patient.created_at.strftime('%Y-%m-%d %H:%M')}")
+
+    # Symptoms
+    y_position -= 40
+    p.setFont(*HEADING_FONT)
+    p.drawString(PDF_MARGIN, y_position, "Symptoms:")
+    y_position -= 30
+
+    # Handle long text
+    y_position = _draw_text_block(p, patient.symptoms, y_position)
+
+    if summary:
+        y_position -= 30
+        p.setFont(*HEADING_FONT)
+        p.drawString(PDF_MARGIN, y_position, "AI Summary:")
+        y_position -= 30
+        y_position = _draw_text_block(p, summary.summary_text, y_position)
+
+    p.save()
+    return buffer.getvalue()
 
 @router.get("/{patient_id}/export/pdf")
 async def export_patient_pdf(
     patient_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Export patient data as PDF"""
-    try:
-        # Get patient and summary
-        patient = db.query(Patient).filter(Patient.id == patient_id).first()
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        summary = db.query(MedicalSummary).filter(
-            MedicalSummary.patient_id == patient_id
-        ).order_by(MedicalSummary.created_at.desc()).first()
-        
-        # Create PDF
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        
-        # Header
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, height - 50, "MedQ - Medical Summary Report")
-        
-        # Patient Info
-        y_position = height - 100
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y_position, "Patient Information:")
-        
-        y_position -= 30
-        p.setFont("Helvetica", 10)
-        p.drawString(50, y_position, f"Name: {patient.name}")
-        y_position -= 20
-        p.drawString(50, y_position, f"Age: {patient.age}")
-        y_position -= 20
-        p.drawString(50, y_position, f"Gender: {patient.gender}")
-        y_position -= 20
-        p.drawString(50, y_position, f"Date: {patient.created_at.strftime('%Y-%m-%d %H:%M')}")
-        
-        # Symptoms
-        y_position -= 40
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y_position, "Symptoms:")
-        y_position -= 30
-        p.setFont("Helvetica", 10)
-        
-        # Handle long text
-        symptoms_lines = patient.symptoms.split('\n')
-        for line in symptoms_lines:
-            if y_position < 100:  # Start new page if needed
-                p.showPage()
-                y_position = height - 50
-            p.drawString(50, y_position, line[:80])  # Truncate long lines
-            y_position -= 15
-        
-        if summary:
-            y_position -= 30
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(50, y_position, "AI Summary:")
-            y_position -= 30
-            p.setFont("Helvetica", 10)
-            
-            summary_lines = summary.summary_text.split('\n')
-            for line in summary_lines:
-                if y_position < 100:
-                    p.showPage()
-                    y_position = height - 50
-                p.drawString(50, y_position, line[:80])
-                y_position -= 15
-        
-        p.save()
-        buffer.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(buffer.read()),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=patient_{patient_id}_summary.pdf"}
-        )
+    # Get patient and summary
+    patient, summary = await _get_patient_with_latest_summary(db, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    # A new summary or an edit to the patient changes the key, so stale
+    # renders are never served and simply age out of the LRU
+    patient_changed = patient.updated_at or patient.created_at
+    cache_key = (
+        patient_id,
+        int(patient_changed.timestamp()) if patient_changed else 0,
+        summary.id if summary else 0,
+    )
+    etag = f'W/"pdf-{"-".join(map(str, cache_key))}"'
+    headers = {"ETag": etag, "Cache-Control": PDF_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    pdf_bytes = _pdf_cache.get(cache_key)
+    if pdf_bytes is None:
+        # reportlab is CPU-bound and synchronous; keep it off the event loop
+        pdf_bytes = await asyncio.to_thread(_render_pdf, patient, summary)
+        _pdf_cache[cache_key] = pdf_bytes
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
+    headers["Content-Disposition"] = f"attachment; filename=patient_{patient_id}_summary.pdf"
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
@@ -1,22 +1,126 @@
 import google.generativeai as genai
-from typing import Dict, Any, List
-import json
+import google.ai.generativelanguage as glm
+from typing import Dict, Any, List, Optional
+import asyncio
+import hashlib
+import logging
 import re
+import time
 from datetime import datetime
+from itertools import chain
+import orjson
+from cachetools import LRUCache, TTLCache
 
 from app.models.pydantic_models import (
-    IntakeData, IntakeStep, MedicalSummaryResponse, StructuredData, Severity
+    IntakeData, MedicalSummaryResponse, StructuredData, Severity
 )
 from app.utils.config import get_settings
 
-class AIService:
-    def __init__(self):
-        self.settings = get_settings()
-        genai.configure(api_key=self.settings.gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash-8b')
-        
-        # Intelligent Medical Assistant Prompt
-        self.medical_assistant_prompt = """
+logger = logging.getLogger(__name__)
+
+_EMERGENCY_KEYWORDS = (
+    "chest pain", "difficulty breathing", "can't breathe", "unconscious",
+    "bleeding heavily", "severe bleeding", "heart attack", "stroke",
+    "difficulty speaking", "weakness on one side", "severe headache",
+    "sudden vision loss", "severe abdominal pain", "choking"
+)
+
+# One compiled alternation scans a message once in C instead of once per keyword
+_EMERGENCY_PATTERN = re.compile("|".join(map(re.escape, _EMERGENCY_KEYWORDS)))
+
+# Shared by the chat and intake flows; filled with the lowercased message
+_EMERGENCY_TEMPLATE = """🚨 **EMERGENCY ALERT** 🚨
+
+Based on your symptoms, you should seek IMMEDIATE medical attention. Please go to the nearest emergency room or call emergency services right away.
+
+If you're experiencing {message}, this could be a serious medical emergency that requires immediate professional care.
+
+⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."""
+
+def _keyword_classifier(buckets: Dict[str, tuple]):
+    """Compile keyword buckets into one pattern reporting every bucket hit.
+
+    The lookahead matches at each offset without consuming input, so
+    overlapping hits are all seen, same as a substring test per keyword.
+    Only the longest keyword is matched at a given offset, so each keyword
+    also reports the buckets of any keyword that is a prefix of it.
+    """
+    names: Dict[str, set] = {}
+    for name, words in buckets.items():
+        for word in words:
+            names.setdefault(word, set()).add(name)
+    hits = {
+        word: frozenset().union(*(found for other, found in names.items() if word.startswith(other)))
+        for word in names
+    }
+    longest_first = sorted(names, key=len, reverse=True)
+    pattern = re.compile(f"(?=({'|'.join(map(re.escape, longest_first))}))")
+    return lambda text: set().union(*(hits[match.group(1)] for match in pattern.finditer(text)))
+
+# Keyword buckets for the rule-based fallback reply, checked in this order
+_classify_fallback = _keyword_classifier({
+    "greeting": ("hi", "hello", "hey", "good morning", "good afternoon"),
+    "symptom": ("pain", "hurt", "ache", "tired", "fever", "sick", "nausea"),
+    "duration": ("day", "week", "month", "hour", "long"),
+})
+
+# Symptom keywords the rule-based summary sections branch on
+_classify_symptoms = _keyword_classifier({
+    "severe": ("chest pain", "difficulty breathing", "severe pain", "blood", "fever over 101", "vomiting"),
+    "mild": ("mild", "slight", "minor"),
+    "respiratory": ("cold", "cough", "congestion", "runny nose"),
+    "cold": ("cold",),
+    "cough": ("cough",),
+    "fever": ("fever",),
+    "headache": ("headache",),
+})
+_COLD_AND_COUGH = frozenset({"cold", "cough"})
+_SHORT_DURATION_PATTERN = re.compile("few hours|today|1 day")
+
+# Whole-word answers recognised during intake, tested by set membership
+_GREETINGS = frozenset({"hi", "hello", "hey", "good morning", "good afternoon", "good evening"})
+_NONE_ANSWERS = frozenset({"none", "no", "nothing", "n/a"})
+_NO_SYMPTOMS = frozenset({"", "none", "nothing"})
+_NO_DURATION = frozenset({"", "none"})
+# Words a "nothing to report" answer is made of, e.g. "no known allergies"
+# or "I don't take anything"; such answers are recorded as "none"
+_NONE_ANSWER_WORDS = frozenset({
+    "no", "none", "nothing", "n/a", "nope", "not", "any", "anything", "known",
+    "i", "i'm", "im", "don't", "dont", "do", "take", "taking", "have", "currently",
+    "medication", "medications", "meds", "allergy", "allergies",
+})
+_NEGATION_WORDS = frozenset({"no", "none", "nothing", "n/a", "nope", "not", "don't", "dont"})
+_THANKS = frozenset({"thank you", "thanks", "thx"})
+_MALE_TOKENS = frozenset({"male", "man", "boy", "mail", "mal"})
+_FEMALE_TOKENS = frozenset({"female", "woman", "girl"})
+# Single letters only count as the whole reply; inside a sentence "m" is
+# usually the tail of "I'm"
+_GENDER_INITIALS = {"m": "male", "f": "female"}
+_OTHER_TOKENS = frozenset({"other", "non-binary"})
+_OTHER_PHRASES = ("prefer not",)
+_INTAKE_FIELDS = ("name", "age", "gender", "symptoms", "duration", "medications", "allergies")
+# Fields the rules copy from the whole reply; in a multi-answer reply the
+# batch extractor's narrower value is the better one
+_FREE_TEXT_FIELDS = frozenset({"name", "symptoms"})
+# Replies listing several answers at once ("I'm John, 45, male") go to the batch extractor
+_MULTI_ANSWER_PATTERN = re.compile(r"[,;]")
+# Cheap signs that a reply also answers another intake question; a plain list
+# answering only the current one ("headache, fever") never costs a Gemini call
+_FIELD_SIGNALS = {
+    "age": re.compile(r"\b\d{1,3}\b(?!\s*(?:day|week|month|year|hour)s?\b)|\byears? old\b"),
+    "gender": re.compile(r"\b(?:male|female|man|woman|boy|girl|non-binary)\b"),
+    "symptoms": re.compile(r"pain|ache|fever|cough|nause|dizz|vomit|fatigue|tired|sore|rash|bleed"),
+    "duration": re.compile(r"\b\d+\s*(?:day|week|month|year|hour)s?\b(?!\s*old)|\bsince\b|\byesterday\b"),
+    "medications": re.compile(r"\btak(?:e|ing)\b|\bmg\b|medication|\bmeds\b"),
+    "allergies": re.compile(r"allerg"),
+}
+_ANSWER_WORD_PATTERN = re.compile(r"[\w/'-]+")
+
+_DURATION_UNIT_PATTERN = re.compile("day|week|month|year|hour")
+_DIGITS_PATTERN = re.compile(r'\d+')
+
+# Intelligent Medical Assistant Prompt
+MEDICAL_ASSISTANT_PROMPT = """
 You are an intelligent, compassionate, and safety-aware virtual medical assistant.
 
 Your role is to help users who describe their health symptoms or ask general medical questions. You should:
@@ -37,50 +141,490 @@ You: I'm sorry to hear that. How long have you been feeling this way? Do you als
 Your answers must feel human-like, safe, and responsive.
 """
 
-    async def analyze_user_input(self, user_input: str, context: Dict[str, Any] = None) -> IntakeStep:
-        """Analyze user input and determine the next step in the medical intake process."""
+# Flow-specific instructions appended to the system prompt of each request template
+_ASSISTANT_INSTRUCTIONS = """
+Please respond as the compassionate medical assistant. Remember to:
+- Be empathetic and caring
+- Ask relevant follow-up questions
+- Provide general wellness advice when appropriate
+- Include the disclaimer about consulting a medical professional
+- If emergency symptoms are mentioned, prioritize immediate medical attention
+
+Respond naturally and conversationally.
+"""
+_INTAKE_INSTRUCTIONS = """
+You are helping with a medical intake process. The user is providing information step by step.
+
+Please respond as the compassionate medical assistant conducting intake. Remember to:
+- Be empathetic and caring
+- Acknowledge what they've shared
+- Guide them to the next step naturally
+- Ask relevant follow-up questions when appropriate
+- Provide gentle encouragement
+- Include the disclaimer about consulting a medical professional
+
+If they've just provided their name, welcome them warmly and ask for their age.
+If they've provided age, ask about gender.
+If they've provided gender, ask about their main symptoms.
+If they've provided symptoms, ask about duration.
+If they've provided duration, ask about medications.
+If they've provided medications, ask about allergies.
+If they've provided allergies, let them know you'll create a summary.
+
+Respond naturally and conversationally.
+"""
+
+# JSON schema _extraction_request replies follow; fields not stated come back null
+_INTAKE_SCHEMA = glm.Schema(
+    type_=glm.Type.OBJECT,
+    properties={
+        "name": glm.Schema(type_=glm.Type.STRING, nullable=True),
+        "age": glm.Schema(type_=glm.Type.INTEGER, nullable=True),
+        "gender": glm.Schema(type_=glm.Type.STRING, enum=["male", "female", "other"], nullable=True),
+        "symptoms": glm.Schema(type_=glm.Type.STRING, nullable=True),
+        "duration": glm.Schema(type_=glm.Type.STRING, nullable=True),
+        "medications": glm.Schema(type_=glm.Type.STRING, nullable=True),
+        "allergies": glm.Schema(type_=glm.Type.STRING, nullable=True),
+    },
+)
+_EXTRACTION_PROMPT = (
+    "Extract the patient's {fields} from this message: '{message}'. "
+    "Use null for anything the message does not state; do not guess."
+)
+
+# Static part of the summary prompt, bound to _summary_request as its system instruction
+_SUMMARY_INSTRUCTIONS = """
+You are Dr. Sarah, an experienced family physician with 15 years of practice. Create a comprehensive medical summary based on the patient intake information below. Be intelligent, practical, and provide specific recommendations.
+
+Based on the symptoms, age, and presentation, provide:
+
+1. **CHIEF COMPLAINT**: Clear statement of the main issue
+2. **HISTORY OF PRESENT ILLNESS**: Detailed analysis of symptoms
+3. **CURRENT MEDICATIONS**: List what they're taking
+4. **ALLERGIES**: Note any allergies
+5. **CLINICAL ASSESSMENT**: Your professional medical opinion about the likely condition(s)
+6. **RECOMMENDED MEDICATIONS**: Suggest specific over-the-counter or prescription medications with dosages
+7. **HOME REMEDIES & LIFESTYLE**: Practical home care suggestions
+8. **WHEN TO SEEK IMMEDIATE CARE**: Red flag symptoms to watch for
+9. **FOLLOW-UP RECOMMENDATIONS**: Specific timeline for follow-up care
+
+Be specific about:
+- Medication names, dosages, and frequencies
+- Duration of treatment
+- Specific symptoms that would warrant immediate medical attention
+- Practical home remedies that are evidence-based
+- Expected timeline for improvement
+
+Format as a professional medical note but make it intelligent and actionable.
+"""
+
+# Labels of the patient block sent with each summary request, in value order
+_SUMMARY_PROMPT_LABELS = (
+    "Patient Information:\n- Name: ",
+    "\n- Age: ",
+    "\n- Gender: ",
+    "\n- Chief Complaint: ",
+    "\n- Duration: ",
+    "\n- Current Medications: ",
+    "\n- Allergies: ",
+)
+
+# Intake prompts keyed by step; only the template for the step in play is formatted
+_ENHANCED_RESPONSES = {
+    "name": "Hello! I'm Dr. Sarah, your AI medical assistant. I'm here to help gather some information before your consultation. Let's start - could you please tell me your name?",
+    "age": "Thank you, {name}. It's good to meet you! I'll be guiding you through some questions to help prepare for your healthcare consultation.\n\nCould you please tell me your age?",
+    "gender": "Thank you for sharing that. Now, to help me understand your medical profile better, what's your gender? You can say male, female, or other.",
+    "symptoms": "Perfect, thank you. Now, I'd like to understand what brought you here today. Could you describe your main symptoms or health concerns? Please take your time and share as much detail as you're comfortable with.",
+    "duration": "I understand you're experiencing {symptoms}. That must be concerning for you.\n\nTo help your healthcare provider understand the timeline, how long have you been experiencing these symptoms?",
+    "medications": "Thank you for that information. Knowing the timeline helps a lot.\n\nNow, are you currently taking any medications? This includes prescription medications, over-the-counter drugs, vitamins, or supplements. If you're not taking anything, just say 'none'.",
+    "allergies": "I've noted that information about your medications.\n\nLastly, do you have any allergies I should know about? This includes food allergies, drug allergies, or environmental allergies. If you don't have any, just say 'none'.",
+    "summary": "Perfect! Thank you for providing all that information. You've been very thorough.\n\nI now have everything I need to create a comprehensive summary for your healthcare provider. This will help them understand your situation quickly and focus on addressing your concerns.\n\nWould you like me to generate your medical summary now?",
+    "complete": "Thank you for using our medical intake system. I hope this helps make your consultation more effective!",
+}
+_ACK_RESPONSES = {
+    "name": "Nice to meet you, {name}! How old are you?",
+    "age": "Thank you! What's your gender - male, female, or other?",
+    "gender": "Thank you! Now, could you describe your main symptoms or concerns? Take your time.",
+    "symptoms": "I understand. How long have you been experiencing these symptoms?",
+    "duration": "Got it. Are you currently taking any medications? If none, just say 'none'.",
+    "medications": "Thank you. Do you have any allergies I should know about? If none, just say 'none'.",
+    "allergies": "Perfect! Thank you for providing all that information. Let me create a summary for your healthcare provider.",
+    "summary": "I've prepared your medical summary. Please let me know if you need anything else.",
+    "complete": "I hope this helps! Let me know if you need anything else.",
+}
+_RETRY_RESPONSES = {
+    "name": "I'd like to get your name for the medical records. What should I call you?",
+    "age": "Could you please tell me your age?",
+    "gender": "What's your gender? You can say male, female, or other.",
+    "symptoms": "What symptoms or health concerns brought you in today?",
+    "duration": "How long have you been experiencing these symptoms?",
+    "medications": "Are you currently taking any medications? If none, just say 'none'.",
+    "allergies": "Do you have any allergies I should know about? If none, just say 'none'.",
+    "summary": "Let me prepare your medical summary now.",
+    "complete": "Your intake is complete!",
+}
+
+# How long a key that hit its quota is skipped before being tried again
+_KEY_COOLDOWN_SECONDS = 60
+# Consecutive quota failures that open the circuit, and how long it stays open
+_CB_FAILURE_THRESHOLD = 3
+_CB_OPEN_SECONDS = 30
+# Cap on Gemini requests in flight per process, so a burst queues here
+# instead of piling onto the API's rate limit
+_MAX_CONCURRENT_GEMINI_CALLS = 16
+
+_MODEL_NAME = "models/gemini-1.5-flash-8b"
+
+def _request_template(
+    system_instruction: Optional[str] = None,
+    generation_config: Optional[glm.GenerationConfig] = None
+) -> glm.GenerateContentRequest:
+    """Request template for one kind of Gemini call; each call copies it and adds the prompt"""
+    return glm.GenerateContentRequest(
+        model=_MODEL_NAME,
+        system_instruction=glm.Content(parts=[glm.Part(text=system_instruction)]) if system_instruction else None,
+        generation_config=generation_config,
+    )
+
+def _is_none_answer(message_lower: str) -> bool:
+    """Whether a medications or allergies reply means there is nothing to report"""
+    if message_lower in _NONE_ANSWERS:
+        return True
+    words = set(_ANSWER_WORD_PATTERN.findall(message_lower))
+    return bool(words) and words <= _NONE_ANSWER_WORDS and bool(words & _NEGATION_WORDS)
+
+def _answers_other_fields(message_lower: str, remaining: List[str], current_step: str) -> bool:
+    """Whether a reply seems to answer a missing field besides the current step's"""
+    return any(
+        field != current_step and field in _FIELD_SIGNALS and _FIELD_SIGNALS[field].search(message_lower)
+        for field in remaining
+    )
+
+# Monotonic clock for key cooldowns and the circuit breaker; tests swap it out
+_clock = time.monotonic
+
+class QuotaExceededError(RuntimeError):
+    """Every configured Gemini key is cooling down after quota errors"""
+
+class CircuitOpenError(RuntimeError):
+    """Gemini calls are suspended after repeated quota errors"""
+
+def _is_quota_error(error: Exception) -> bool:
+    """Whether a Gemini error means the key is rate limited or out of quota"""
+    if isinstance(error, QuotaExceededError):
+        return True
+    return "quota" in str(error).lower() or "429" in str(error)
+
+# Rule-based summary sections keyed by the condition _match_condition picks
+_ASSESSMENTS = {
+    "cold_cough": {
+        "description": "This appears to be consistent with an upper respiratory tract infection (common cold).",
+        "diagnosis": "Likely viral upper respiratory infection (common cold) based on symptom presentation and duration.",
+        "follow_up_timeline": "3-5 days if symptoms persist or worsen",
+        "expected_improvement": "Symptoms typically improve within 7-10 days",
+        "additional_notes": "Viral infections are self-limiting but symptom management is important for comfort.",
+    },
+    "fever": {
+        "description": "Patient presents with fever which may indicate an infectious process.",
+        "diagnosis": "Febrile illness - requires further evaluation to determine underlying cause.",
+        "follow_up_timeline": "24-48 hours if fever persists",
+        "expected_improvement": "Depends on underlying cause",
+        "additional_notes": "Monitor temperature and associated symptoms closely.",
+    },
+    "headache": {
+        "description": "Patient reports headache which could be tension-type or other etiology.",
+        "diagnosis": "Headache - likely tension-type based on presentation.",
+        "follow_up_timeline": "1 week if headaches persist or worsen",
+        "expected_improvement": "Should improve with rest and appropriate treatment",
+        "additional_notes": "Consider triggers such as stress, dehydration, or sleep deprivation.",
+    },
+}
+_DEFAULT_ASSESSMENT = {
+    "description": "Patient presents with symptoms requiring clinical evaluation.",
+    "diagnosis": "Symptoms require further assessment for proper diagnosis.",
+    "follow_up_timeline": "3-5 days",
+    "expected_improvement": "Variable depending on underlying condition",
+    "additional_notes": "Comprehensive evaluation recommended.",
+}
+_MEDICATION_ADVICE = {
+    "cold_cough": """\
+• Acetaminophen 650mg every 6 hours for aches and fever (max 3000mg/day)
+• Ibuprofen 400mg every 6-8 hours for inflammation and pain (max 1200mg/day)
+• Pseudoephedrine 30mg every 6 hours for nasal congestion (if no contraindications)
+• Dextromethorphan 15mg every 4 hours for dry cough
+• Guaifenesin 200-400mg every 4 hours for productive cough
+• Lozenges or throat sprays for sore throat""",
+    "fever": """\
+• Acetaminophen 650mg every 6 hours (max 3000mg/day)
+• Ibuprofen 400mg every 6-8 hours (max 1200mg/day)
+• Alternate between acetaminophen and ibuprofen if needed""",
+    "headache": """\
+• Acetaminophen 650mg every 6 hours (max 3000mg/day)
+• Ibuprofen 400mg every 6-8 hours (max 1200mg/day)
+• Aspirin 500mg every 4-6 hours (if no contraindications)""",
+}
+_MEDICATION_ADVICE_CHILD = "Age-appropriate pediatric formulations of acetaminophen or ibuprofen as directed by weight/age charts."
+_MEDICATION_ADVICE_DEFAULT = "Consult healthcare provider for appropriate medication recommendations."
+_HOME_REMEDIES = {
+    "cold_cough": """\
+• Honey and warm water for cough (1-2 teaspoons of honey in warm water)
+• Steam inhalation 2-3 times daily
+• Warm salt water gargles (1/2 teaspoon salt in warm water)
+• Increase fluid intake (water, herbal teas, clear broths)
+• Use a humidifier or vaporizer
+• Elevate head while sleeping
+• Avoid dairy products which may increase mucus production""",
+    "fever": """\
+• Cool compresses on forehead and wrists
+• Lukewarm baths or showers
+• Light, breathable clothing
+• Increased fluid intake
+• Rest in a cool environment""",
+    "headache": """\
+• Apply cold compress to forehead for 15-20 minutes
+• Gentle neck and shoulder massage
+• Rest in quiet, dark room
+• Stay hydrated
+• Practice relaxation techniques
+• Regular sleep schedule""",
+}
+_HOME_REMEDIES_DEFAULT = "Rest, hydration, and monitoring of symptoms."
+_RED_FLAGS = {
+    "cold_cough": """\
+SEEK IMMEDIATE MEDICAL ATTENTION IF:
+• Difficulty breathing or shortness of breath
+• Chest pain or pressure
+• High fever (>101.5°F/38.6°C) for more than 3 days
+• Coughing up blood or pink-tinged sputum
+• Severe headache with neck stiffness
+• Persistent vomiting
+• Signs of dehydration
+• Symptoms significantly worsen after initial improvement""",
+    "fever": """\
+SEEK IMMEDIATE MEDICAL ATTENTION IF:
+• Temperature >103°F (39.4°C)
+• Difficulty breathing
+• Severe headache with neck stiffness
+• Persistent vomiting
+• Signs of dehydration
+• Confusion or altered mental state
+• Chest pain""",
+    "headache": """\
+SEEK IMMEDIATE MEDICAL ATTENTION IF:
+• Sudden, severe headache ("worst headache of life")
+• Headache with fever and neck stiffness
+• Headache with vision changes
+• Headache with confusion or altered mental state
+• Headache after head injury
+• Progressively worsening headache""",
+}
+_RED_FLAGS_DEFAULT = """\
+SEEK IMMEDIATE MEDICAL ATTENTION IF:
+• Severe or worsening symptoms
+• Difficulty breathing
+• Chest pain
+• High fever
+• Severe headache
+• Persistent vomiting
+• Signs of dehydration"""
+
+# Summary documents written when Gemini is unavailable, filled with format_map
+_FALLBACK_SUMMARY_TEMPLATE = """\
+MEDICAL INTAKE SUMMARY
+Date: {date}
+
+PATIENT INFORMATION:
+Name: {name}
+Age: {age}
+Gender: {gender}
+
+CHIEF COMPLAINT:
+{chief_complaint}
+
+HISTORY OF PRESENT ILLNESS:
+Patient reports {symptoms} for a duration of {duration}.
+
+CURRENT MEDICATIONS:
+{medications}
+
+ALLERGIES:
+{allergies}
+
+ASSESSMENT:
+Patient presents with chief complaint as documented above. Further evaluation by healthcare provider recommended.
+
+PLAN:
+1. Review of symptoms and physical examination
+2. Consider appropriate diagnostic workup based on clinical presentation
+3. Follow-up as clinically indicated
+4. Patient education regarding symptoms and when to seek care
+
+RECOMMENDATIONS:
+- Schedule appointment with primary care physician
+- Monitor symptoms and return if worsening
+- Seek immediate care if symptoms become severe"""
+_INTELLIGENT_SUMMARY_TEMPLATE = """\
+MEDICAL INTAKE SUMMARY
+Date: {date}
+
+PATIENT INFORMATION:
+Name: {name}
+Age: {age}
+Gender: {gender}
+
+CHIEF COMPLAINT:
+{chief_complaint}
+
+HISTORY OF PRESENT ILLNESS:
+{age_years}-year-old {patient} presents with {symptoms} for {duration}. {description}
+
+CURRENT MEDICATIONS:
+{medications}
+
+ALLERGIES:
+{allergies}
+
+CLINICAL ASSESSMENT:
+{diagnosis}
+
+RECOMMENDED MEDICATIONS:
+{medication_advice}
+
+HOME REMEDIES & LIFESTYLE RECOMMENDATIONS:
+{home_remedies}
+
+WHEN TO SEEK IMMEDIATE CARE:
+{red_flags}
+
+FOLLOW-UP RECOMMENDATIONS:
+- Follow up with primary care physician within {follow_up_timeline}
+- Return if symptoms worsen or new symptoms develop
+- Expected improvement timeline: {expected_improvement}
+
+ADDITIONAL NOTES:
+{additional_notes}"""
+
+class AIService:
+    def __init__(self):
+        self.settings = get_settings()
+        
+        # Keys rotated round-robin; one that returns a quota error is skipped
+        # for a cooldown instead of sending every caller to the fallback.
+        # Every call goes through the client of the key it uses, so nothing
+        # depends on the SDK's globally configured key
+        self._api_keys = [
+            key for key in self.settings.gemini_api_keys or [self.settings.gemini_api_key] if key
+        ]
+        self._key_idx = 0
+        self._key_cold_until: Dict[int, float] = {}
+        self._key_clients: Dict[int, glm.GenerativeServiceAsyncClient] = {}
+        # Circuit breaker: while open, calls fail fast to the rule-based fallback;
+        # once the open period ends a single probe call decides whether it closes
+        self._cb_open_until = 0.0
+        self._cb_fail_count = 0
+        self._cb_probing = False
+        self._gemini_slots = asyncio.Semaphore(_MAX_CONCURRENT_GEMINI_CALLS)
+        self._chat_request = _request_template()
+        
+        # Recent completions keyed by prompt digest; intake flows repeat the
+        # same short prompts often enough that hits skip the API round-trip
+        self._gen_cache = TTLCache(maxsize=1024, ttl=600)
+        # Calls currently awaiting Gemini, so concurrent identical prompts share one
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        # Gemini-written summaries keyed by the normalised intake answers, so
+        # retries and re-renders of the same intake don't regenerate them
+        self._summary_cache = LRUCache(maxsize=256)
+        
+        # The static instructions are bound to the request templates as system
+        # instructions, so per-request prompts carry only the conversation
+        self._assistant_request = _request_template(MEDICAL_ASSISTANT_PROMPT + _ASSISTANT_INSTRUCTIONS)
+        self._intake_request = _request_template(MEDICAL_ASSISTANT_PROMPT + _INTAKE_INSTRUCTIONS)
+        self._summary_request = _request_template(_SUMMARY_INSTRUCTIONS)
+        self._extraction_request = _request_template(generation_config=glm.GenerationConfig(
+            response_mime_type="application/json", response_schema=_INTAKE_SCHEMA
+        ))
+
+    async def _cached_generate(self, prompt: str, template: glm.GenerateContentRequest = None) -> str:
+        """Return the model's text for prompt, reusing a recent identical call"""
+        template = template or self._chat_request
+        # The template is part of the key since each carries its own system instruction
+        key = (id(template), hashlib.blake2b(prompt.encode(), digest_size=16).digest())
+        text = self._gen_cache.get(key)
+        if text is not None:
+            return text
+        
+        call = self._inflight.get(key)
+        if call is None:
+            # The async client keeps the event loop free for the whole round-trip
+            call = asyncio.ensure_future(self._generate(template, prompt))
+            self._inflight[key] = call
+            call.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller disconnecting doesn't cancel the shared call
+        text = (await asyncio.shield(call)).text
+        self._gen_cache[key] = text
+        return text
+    
+    async def _generate_with_key(self, template: glm.GenerateContentRequest, prompt: str, key_idx: int):
+        """Send prompt on a copy of template through the client for one API key"""
+        client = self._key_clients.get(key_idx)
+        if client is None:
+            # Built on first use, inside the running event loop
+            client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self._api_keys[key_idx]})
+            self._key_clients[key_idx] = client
+        request = glm.GenerateContentRequest()
+        glm.GenerateContentRequest.copy_from(request, template)
+        request.contents.append(glm.Content(role="user", parts=[glm.Part(text=prompt)]))
+        response = await client.generate_content(request=request)
+        return genai.types.GenerateContentResponse.from_response(response)
+    
+    async def _generate(self, template: glm.GenerateContentRequest, prompt: str):
+        """Call Gemini unless repeated quota errors have opened the circuit"""
+        probe = False
+        if self._cb_open_until:
+            if self._cb_probing or _clock() < self._cb_open_until:
+                raise CircuitOpenError("Gemini circuit open after repeated quota errors")
+            # Half-open: this call alone tests whether the quota has recovered
+            self._cb_probing = probe = True
         try:
-            prompt = f"""
-            You are a medical AI assistant helping with patient intake. Based on the user's input, determine what medical information to collect next.
-            
-            User Input: "{user_input}"
-            Context: {json.dumps(context or {}, indent=2)}
-            
-            Return a JSON response with:
-            - step: The category of information needed (chief_complaint, symptoms, medical_history, medications, allergies, demographics)
-            - question: A clear, empathetic question to ask the patient
-            - completed: Boolean indicating if this step is complete
-            - data_collected: Any relevant data extracted from the user's input
-            
-            Be conversational and show empathy. Ask one focused question at a time.
-            """
-            
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            result = json.loads(response_text)
-            
-            return IntakeStep(
-                step=result.get('step', 'chief_complaint'),
-                question=result.get('question', 'Can you tell me what brought you in today?'),
-                completed=result.get('completed', False),
-                data_collected=result.get('data_collected', {})
-            )
-            
+            async with self._gemini_slots:
+                response = await self._generate_with_failover(template, prompt)
         except Exception as e:
-            # Fallback to default response
-            return IntakeStep(
-                step='chief_complaint',
-                question='Can you tell me what brought you in today?',
-                completed=False,
-                data_collected={}
-            )
+            if _is_quota_error(e):
+                self._cb_fail_count += 1
+                if probe or self._cb_fail_count >= _CB_FAILURE_THRESHOLD:
+                    self._cb_open_until = _clock() + _CB_OPEN_SECONDS
+                    self._cb_fail_count = 0
+                    logger.warning("Gemini quota exhausted; skipping API calls for %ss", _CB_OPEN_SECONDS)
+            raise
+        finally:
+            if probe:
+                self._cb_probing = False
+        self._cb_open_until = 0.0
+        self._cb_fail_count = 0
+        return response
+    
+    async def _generate_with_failover(self, template: glm.GenerateContentRequest, prompt: str):
+        """Call Gemini, failing over to the next warm API key on quota errors"""
+        if not self._api_keys:
+            raise RuntimeError("No Gemini API key configured")
+        if len(self._api_keys) == 1:
+            return await self._generate_with_key(template, prompt, 0)
+        
+        error = None
+        for _ in range(len(self._api_keys)):
+            key_idx = self._key_idx
+            self._key_idx = (key_idx + 1) % len(self._api_keys)
+            if self._key_cold_until.get(key_idx, 0) > _clock():
+                continue
+            try:
+                return await self._generate_with_key(template, prompt, key_idx)
+            except Exception as e:
+                if not _is_quota_error(e):
+                    raise
+                self._key_cold_until[key_idx] = _clock() + _KEY_COOLDOWN_SECONDS
+                error = e
+        # Every key is cooling down; surface a quota error so callers fall back
+        raise error or QuotaExceededError("All Gemini API keys are over quota")
     
     async def intelligent_medical_conversation(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
@@ -93,37 +637,18 @@ Your answers must feel human-like, safe, and responsive.
         Returns:
             Dict containing the assistant's response and any safety flags
         """
+        # Lowercased once and shared by the emergency check and the fallback
+        msg_lower = user_message.lower()
         try:
-            print(f"DEBUG: Processing medical conversation for message: {user_message}")
-            print(f"DEBUG: API Key available: {bool(self.settings.gemini_api_key)}")
-            
-            # Build conversation context
-            context = ""
-            if conversation_history:
-                context = "\n\nConversation History:\n"
-                for msg in conversation_history[-5:]:  # Keep last 5 messages for context
-                    role = "User" if msg["role"] == "user" else "Assistant"
-                    context += f"{role}: {msg['content']}\n"
+            logger.debug("Processing medical conversation for message: %s", user_message)
+            logger.debug("API key available: %s", bool(self.settings.gemini_api_key))
             
-            # Check for emergency symptoms
-            emergency_keywords = [
-                "chest pain", "difficulty breathing", "can't breathe", "unconscious", 
-                "bleeding heavily", "severe bleeding", "heart attack", "stroke",
-                "difficulty speaking", "weakness on one side", "severe headache",
-                "sudden vision loss", "severe abdominal pain", "choking"
-            ]
-            
-            is_emergency = any(keyword in user_message.lower() for keyword in emergency_keywords)
+            # Check for emergency symptoms before any context is built
+            is_emergency = _EMERGENCY_PATTERN.search(msg_lower) is not None
             
             # If this is an emergency, provide immediate response
             if is_emergency:
-                emergency_response = f"""🚨 **EMERGENCY ALERT** 🚨
-
-Based on your symptoms, you should seek IMMEDIATE medical attention. Please go to the nearest emergency room or call emergency services right away.
-
-If you're experiencing {user_message.lower()}, this could be a serious medical emergency that requires immediate professional care.
-
-⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."""
+                emergency_response = _EMERGENCY_TEMPLATE.format(message=msg_lower)
                 
                 return {
                     "response": emergency_response,
@@ -132,37 +657,30 @@ If you're experiencing {user_message.lower()}, this could be a serious medical e
                     "conversation_complete": False
                 }
             
+            # Build conversation context
+            context = ""
+            if conversation_history:
+                context = "\n\nConversation History:\n"
+                for msg in conversation_history[-5:]:  # Keep last 5 messages for context
+                    role = "User" if msg["role"] == "user" else "Assistant"
+                    context += f"{role}: {msg['content']}\n"
+            
             # Try to use AI, but fall back to rule-based responses if quota exceeded
             try:
                 # Construct the prompt
-                prompt = f"""
-{self.medical_assistant_prompt}
-
-{context}
-
-Current User Message: "{user_message}"
-
-Please respond as the compassionate medical assistant. Remember to:
-- Be empathetic and caring
-- Ask relevant follow-up questions
-- Provide general wellness advice when appropriate
-- Include the disclaimer about consulting a medical professional
-- If emergency symptoms are mentioned, prioritize immediate medical attention
-
-Respond naturally and conversationally.
-"""
+                prompt = "".join((context, '\nCurrent User Message: "', user_message, '"\n'))
                 
-                print(f"DEBUG: Sending prompt to Gemini API...")
-                response = self.model.generate_content(prompt)
-                print(f"DEBUG: Received response from Gemini API: {response.text[:100]}...")
+                logger.debug("Sending prompt to Gemini API")
+                response_text = await self._cached_generate(prompt, self._assistant_request)
+                logger.debug("Received response from Gemini API: %.100s", response_text)
                 
-                assistant_response = response.text.strip()
+                assistant_response = response_text.strip()
                 
                 # Ensure disclaimer is included if not already present
                 if "not a diagnosis" not in assistant_response.lower() and "consult" not in assistant_response.lower():
                     assistant_response += "\n\n⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."
                 
-                print(f"DEBUG: Final response: {assistant_response[:100]}...")
+                logger.debug("Final response: %.100s", assistant_response)
                 
                 return {
                     "response": assistant_response,
@@ -172,31 +690,30 @@ Respond naturally and conversationally.
                 }
                 
             except Exception as api_error:
-                print(f"DEBUG: API Error: {str(api_error)}")
+                logger.warning("Gemini API error: %s", api_error)
                 
-                # Check if it's a quota exceeded error
-                if "quota" in str(api_error).lower() or "429" in str(api_error):
+                # Quota errors, and the breaker they open, get the rule-based reply
+                if isinstance(api_error, CircuitOpenError) or _is_quota_error(api_error):
                     # Use fallback rule-based responses
-                    return self._get_fallback_medical_response(user_message, conversation_history)
+                    return self._get_fallback_medical_response(user_message, msg_lower, conversation_history)
                 else:
                     # Re-raise other errors
                     raise api_error
             
         except Exception as e:
-            print(f"DEBUG: Error in intelligent_medical_conversation: {str(e)}")
-            print(f"DEBUG: Error type: {type(e)}")
+            logger.warning("Error in intelligent_medical_conversation (%s): %s", type(e).__name__, e)
             
             # Use fallback response
-            return self._get_fallback_medical_response(user_message, conversation_history)
+            return self._get_fallback_medical_response(user_message, msg_lower, conversation_history)
     
-    def _get_fallback_medical_response(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
+    def _get_fallback_medical_response(self, user_message: str, msg_lower: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Provide fallback medical responses when AI is unavailable (quota exceeded, etc.)
         """
-        message_lower = user_message.lower().strip()
+        buckets = _classify_fallback(msg_lower)
         
         # Handle greetings
-        if any(greeting in message_lower for greeting in ["hi", "hello", "hey", "good morning", "good afternoon"]):
+        if "greeting" in buckets:
             response = """Hello! I'm Dr. Sarah, your AI medical assistant. I'm here to help you with your health concerns.
 
 I understand you're reaching out for medical guidance. While I'd love to provide more detailed responses, I'm currently experiencing high usage.
@@ -209,8 +726,8 @@ To help you effectively, could you please tell me:
 ⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."""
             
         # Handle symptom descriptions
-        elif any(symptom in message_lower for symptom in ["pain", "hurt", "ache", "tired", "fever", "sick", "nausea"]):
-            response = f"""I'm sorry to hear you're experiencing {user_message.lower()}. That must be concerning for you.
+        elif "symptom" in buckets:
+            response = f"""I'm sorry to hear you're experiencing {msg_lower}. That must be concerning for you.
 
 To better understand your situation, could you tell me:
 1. How long have you been experiencing these symptoms?
@@ -227,7 +744,7 @@ However, if your symptoms are severe, getting worse, or you're concerned, please
 ⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."""
             
         # Handle duration questions
-        elif any(duration in message_lower for duration in ["day", "week", "month", "hour", "long"]):
+        elif "duration" in buckets:
             response = f"""Thank you for sharing that information. {user_message} can help me understand your situation better.
 
 Based on what you've told me, here are some general wellness suggestions:
@@ -264,18 +781,34 @@ If this is urgent or you're experiencing severe symptoms, please don't hesitate
     async def process_intake_message(self, message: str, current_data: IntakeData) -> Dict[str, Any]:
         """Process user message and extract relevant medical information with intelligent responses"""
         
-        print(f"DEBUG: Processing message: '{message}' at step: {current_data.current_step}")
-        
-        # First, try to extract data intelligently without AI
-        extracted_data = self._smart_extract_data(message, current_data.current_step)
-        print(f"DEBUG: Extracted data: {extracted_data}")
+        logger.debug("Processing message %r at step %s", message, current_data.current_step)
         
-        # Merge extracted data with current data to determine next step
-        updated_data = {**current_data.dict(), **extracted_data}
-        print(f"DEBUG: Updated data: {updated_data}")
+        # Normalised once and passed down instead of re-stripping/lowering per check
+        msg_stripped = message.strip()
+        msg_lower = msg_stripped.lower()
         
-        next_step = self._determine_next_step_from_data(updated_data)
-        print(f"DEBUG: Next step: {next_step}")
+        # First, try to extract data intelligently without AI
+        extracted_data = self._smart_extract_data(msg_stripped, msg_lower, current_data.current_step)
+        # A reply that answers several questions is read in one Gemini call;
+        # parsed answers (age, gender) keep their rule-based value, while
+        # free-text ones take the model's since the rules copy the whole reply
+        if not extracted_data.get("is_greeting") and _MULTI_ANSWER_PATTERN.search(msg_stripped):
+            remaining = [
+                field for field in _INTAKE_FIELDS
+                if not getattr(current_data, field)
+                and (field not in extracted_data or field in _FREE_TEXT_FIELDS)
+            ]
+            if _answers_other_fields(msg_lower, remaining, current_data.current_step):
+                for field, value in (await self._extract_all_remaining(msg_stripped, remaining)).items():
+                    if field in _FREE_TEXT_FIELDS:
+                        extracted_data[field] = value
+                    else:
+                        extracted_data.setdefault(field, value)
+        logger.debug("Extracted data: %s", extracted_data)
+        
+        # Determine next step from current data overlaid with the extraction
+        next_step = self._determine_next_step(current_data, extracted_data)
+        logger.debug("Next step: %s", next_step)
         
         # Build conversation history for context
         conversation_history = []
@@ -286,23 +819,10 @@ If this is urgent or you're experiencing severe symptoms, please don't hesitate
             })
         
         # Check for emergency symptoms first
-        emergency_keywords = [
-            "chest pain", "difficulty breathing", "can't breathe", "unconscious", 
-            "bleeding heavily", "severe bleeding", "heart attack", "stroke",
-            "difficulty speaking", "weakness on one side", "severe headache",
-            "sudden vision loss", "severe abdominal pain", "choking"
-        ]
-        
-        is_emergency = any(keyword in message.lower() for keyword in emergency_keywords)
+        is_emergency = _EMERGENCY_PATTERN.search(msg_lower) is not None
         
         if is_emergency:
-            emergency_response = f"""🚨 **EMERGENCY ALERT** 🚨
-
-Based on your symptoms, you should seek IMMEDIATE medical attention. Please go to the nearest emergency room or call emergency services right away.
-
-If you're experiencing {message.lower()}, this could be a serious medical emergency that requires immediate professional care.
-
-⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."""
+            emergency_response = _EMERGENCY_TEMPLATE.format(message=msg_lower)
             
             return {
                 "response": emergency_response,
@@ -317,9 +837,9 @@ If you're experiencing {message.lower()}, this could be a serious medical emerge
                 message, current_data, next_step, extracted_data, conversation_history
             )
         except Exception as e:
-            print(f"DEBUG: Error getting intelligent response: {e}")
+            logger.warning("Error getting intelligent response: %s", e)
             # Fall back to basic contextual response
-            response_message = self._get_contextual_response(message, current_data, next_step, extracted_data)
+            response_message = self._get_contextual_response(msg_lower, current_data, next_step, extracted_data)
         
         # Remove internal flags from extracted_data before returning
         clean_extracted_data = {k: v for k, v in extracted_data.items() if k != "is_greeting"}
@@ -337,42 +857,15 @@ If you're experiencing {message.lower()}, this could be a serious medical emerge
         intake_context = f"""
 Current intake step: {current_data.current_step}
 Next step: {next_step}
-Data collected so far: {current_data.dict()}
+Data collected so far: {current_data.model_dump_json(exclude_none=True)}
 Just extracted: {extracted_data}
 """
         
         # Try AI first, then fall back to rule-based
         try:
-            prompt = f"""
-{self.medical_assistant_prompt}
-
-You are helping with a medical intake process. The user is providing information step by step.
-
-{intake_context}
-
-Current User Message: "{message}"
-
-Please respond as the compassionate medical assistant conducting intake. Remember to:
-- Be empathetic and caring
-- Acknowledge what they've shared
-- Guide them to the next step naturally
-- Ask relevant follow-up questions when appropriate
-- Provide gentle encouragement
-- Include the disclaimer about consulting a medical professional
-
-If they've just provided their name, welcome them warmly and ask for their age.
-If they've provided age, ask about gender.
-If they've provided gender, ask about their main symptoms.
-If they've provided symptoms, ask about duration.
-If they've provided duration, ask about medications.
-If they've provided medications, ask about allergies.
-If they've provided allergies, let them know you'll create a summary.
-
-Respond naturally and conversationally.
-"""
+            prompt = "".join((intake_context, '\nCurrent User Message: "', message, '"\n'))
             
-            response = self.model.generate_content(prompt)
-            assistant_response = response.text.strip()
+            assistant_response = (await self._cached_generate(prompt, self._intake_request)).strip()
             
             # Ensure disclaimer is included for medical content
             if any(medical_word in assistant_response.lower() for medical_word in ["symptom", "pain", "medical", "health", "condition"]):
@@ -382,7 +875,7 @@ Respond naturally and conversationally.
             return assistant_response
             
         except Exception as api_error:
-            print(f"DEBUG: AI API Error: {str(api_error)}")
+            logger.warning("Gemini API error: %s", api_error)
             
             # Fall back to enhanced contextual responses
             return self._get_enhanced_contextual_response(message, current_data, next_step, extracted_data)
@@ -398,129 +891,86 @@ I'll ask you a few questions to understand your situation better. This is comple
 
 Let's start - could you please tell me your name?"""
         
-        # Enhanced responses for each step based on NEXT step, not current step
-        responses = {
-            "name": f"Hello! I'm Dr. Sarah, your AI medical assistant. I'm here to help gather some information before your consultation. Let's start - could you please tell me your name?",
-            
-            "age": f"Thank you, {extracted_data.get('name', '')}. It's good to meet you! I'll be guiding you through some questions to help prepare for your healthcare consultation.\n\nCould you please tell me your age?",
-            
-            "gender": f"Thank you for sharing that. Now, to help me understand your medical profile better, what's your gender? You can say male, female, or other.",
-            
-            "symptoms": f"Perfect, thank you. Now, I'd like to understand what brought you here today. Could you describe your main symptoms or health concerns? Please take your time and share as much detail as you're comfortable with.",
-            
-            "duration": f"I understand you're experiencing {extracted_data.get('symptoms', 'these symptoms')}. That must be concerning for you.\n\nTo help your healthcare provider understand the timeline, how long have you been experiencing these symptoms?",
-            
-            "medications": f"Thank you for that information. Knowing the timeline helps a lot.\n\nNow, are you currently taking any medications? This includes prescription medications, over-the-counter drugs, vitamins, or supplements. If you're not taking anything, just say 'none'.",
-            
-            "allergies": f"I've noted that information about your medications.\n\nLastly, do you have any allergies I should know about? This includes food allergies, drug allergies, or environmental allergies. If you don't have any, just say 'none'.",
-            
-            "summary": f"Perfect! Thank you for providing all that information. You've been very thorough.\n\nI now have everything I need to create a comprehensive summary for your healthcare provider. This will help them understand your situation quickly and focus on addressing your concerns.\n\nWould you like me to generate your medical summary now?",
-            
-            "complete": "Thank you for using our medical intake system. I hope this helps make your consultation more effective!"
-        }
-        
         # Use the NEXT step to determine what to ask
-        return responses.get(next_step, f"Thank you for that information. Let me know if you have any questions about the next step in your intake process.")
-        
-        response = responses.get(next_step, "Thank you for that information. Could you please provide more details?")
-        
-        # Add medical disclaimer for symptom-related responses
-        if next_step in ["symptoms", "duration", "medications", "allergies"] and "not a diagnosis" not in response.lower():
-            response += "\n\n⚠️ **Important:** This is not a diagnosis. Please consult a licensed medical professional for proper care."
-        
-        return response
+        template = _ENHANCED_RESPONSES.get(next_step)
+        if template is None:
+            return "Thank you for that information. Let me know if you have any questions about the next step in your intake process."
+        return template.format(
+            name=extracted_data.get("name", ""),
+            symptoms=extracted_data.get("symptoms", "these symptoms"),
+        )
     
-    def _smart_extract_data(self, message: str, current_step: str) -> Dict[str, Any]:
-        """Extract data using smart pattern matching instead of AI"""
-        message_lower = message.lower().strip()
-        
+    def _smart_extract_data(self, message: str, message_lower: str, current_step: str) -> Dict[str, Any]:
+        """Extract data using smart pattern matching instead of AI (message is pre-stripped, message_lower lowercased)"""
         if current_step == "name":
             # Handle common greetings more naturally
-            if message_lower in ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]:
+            if message_lower in _GREETINGS:
                 # Instead of returning empty, trigger the greeting response
                 return {"is_greeting": True}
             # Only extract name if it's not just a greeting
-            return {"name": message.strip()}
+            return {"name": message}
         
         elif current_step == "age":
-            # Extract numbers
-            import re
-            numbers = re.findall(r'\d+', message)
-            if numbers:
-                age = int(numbers[0])
-                if 1 <= age <= 150:  # reasonable age range
-                    return {"age": age}
+            # Most replies are the bare number; otherwise take the first one in the text
+            if message.isdecimal():
+                age = int(message)
+            else:
+                match = _DIGITS_PATTERN.search(message)
+                age = int(match.group()) if match else 0
+            if 1 <= age <= 150:  # reasonable age range
+                return {"age": age}
             return {}
         
         elif current_step == "gender":
-            if any(word in message_lower for word in ["male", "man", "boy", "mail", "mal", "m"]):
+            if message_lower in _GENDER_INITIALS:
+                return {"gender": _GENDER_INITIALS[message_lower]}
+            # Apostrophes stay inside words, so "I'm female" never yields "m"
+            tokens = set(_ANSWER_WORD_PATTERN.findall(message_lower))
+            if tokens & _MALE_TOKENS:
                 return {"gender": "male"}
-            elif any(word in message_lower for word in ["female", "woman", "girl"]):
+            elif tokens & _FEMALE_TOKENS:
                 return {"gender": "female"}
-            elif any(word in message_lower for word in ["other", "non-binary", "prefer not"]):
+            elif tokens & _OTHER_TOKENS or any(phrase in message_lower for phrase in _OTHER_PHRASES):
                 return {"gender": "other"}
             return {}
         
         elif current_step == "symptoms":
-            if message_lower not in ["", "none", "nothing"]:
-                return {"symptoms": message.strip()}
+            if message_lower not in _NO_SYMPTOMS:
+                return {"symptoms": message}
             return {}
         
         elif current_step == "duration":
-            if message_lower not in ["", "none"]:
+            if message_lower not in _NO_DURATION:
                 # Standardize duration format
-                duration = message.strip()
-                if any(word in message_lower for word in ["day", "week", "month", "year", "hour"]):
+                duration = message
+                if _DURATION_UNIT_PATTERN.search(message_lower):
                     return {"duration": duration}
-                elif any(char.isdigit() for char in message):
+                elif _DIGITS_PATTERN.search(message):
                     # Add "days" if just a number
                     return {"duration": f"{duration} days"}
             return {}
         
         elif current_step == "medications":
-            if message_lower in ["none", "no", "nothing", "n/a"]:
+            if _is_none_answer(message_lower):
                 return {"medications": "none"}
-            elif message_lower not in [""]:
-                return {"medications": message.strip()}
+            elif message_lower:
+                return {"medications": message}
             return {}
         
         elif current_step == "allergies":
-            if message_lower in ["none", "no", "nothing", "n/a"]:
+            if _is_none_answer(message_lower):
                 return {"allergies": "none"}
-            elif message_lower not in [""]:
-                return {"allergies": message.strip()}
+            elif message_lower:
+                return {"allergies": message}
             return {}
         
         return {}
     
-    def _determine_next_step_from_data(self, data: Dict[str, Any]) -> str:
-        """Determine next step based on what data we have"""
-        # Don't treat greeting as name data
-        if data.get("is_greeting"):
-            return "name"
-        
-        if not data.get("name"):
-            return "name"
-        elif not data.get("age"):
-            return "age"
-        elif not data.get("gender"):
-            return "gender"
-        elif not data.get("symptoms"):
-            return "symptoms"
-        elif not data.get("duration"):
-            return "duration"
-        elif not data.get("medications"):
-            return "medications"
-        elif not data.get("allergies"):
-            return "allergies"
-        else:
-            return "summary"
-    
-    def _get_contextual_response(self, message: str, current_data: IntakeData, next_step: str, extracted_data: Dict) -> str:
-        """Generate contextual response based on what was extracted"""
+    def _get_contextual_response(self, message_lower: str, current_data: IntakeData, next_step: str, extracted_data: Dict) -> str:
+        """Generate contextual response based on what was extracted (message already stripped and lowercased)"""
         
         # Handle thank you messages
-        if message.lower().strip() in ["thank you", "thanks", "thx"]:
+        if message_lower in _THANKS:
             return "You're welcome! Let me know if you need anything else."
             
         # If we extracted data, acknowledge it and move to next step
@@ -529,265 +979,90 @@ Let's start - could you please tell me your name?"""
             if extracted_data.get("is_greeting"):
                 return "Hello! I'm Dr. Sarah, and I'll be helping you today. Could you please tell me your name?"
                 
-            responses = {
-                "name": f"Nice to meet you, {extracted_data.get('name', '')}! How old are you?",
-                "age": f"Thank you! What's your gender - male, female, or other?",
-                "gender": "Thank you! Now, could you describe your main symptoms or concerns? Take your time.",
-                "symptoms": "I understand. How long have you been experiencing these symptoms?",
-                "duration": "Got it. Are you currently taking any medications? If none, just say 'none'.",
-                "medications": "Thank you. Do you have any allergies I should know about? If none, just say 'none'.",
-                "allergies": "Perfect! Thank you for providing all that information. Let me create a summary for your healthcare provider.",
-                "summary": "I've prepared your medical summary. Please let me know if you need anything else.",
-                "complete": "I hope this helps! Let me know if you need anything else."
-            }
-            
             # Get the field that was just extracted
             for field in extracted_data:
-                if field in responses:
-                    return responses[field]
+                if field in _ACK_RESPONSES:
+                    return _ACK_RESPONSES[field].format(name=extracted_data.get("name", ""))
         
         # Fallback responses for when we need to ask again
-        fallback_responses = {
-            "name": "I'd like to get your name for the medical records. What should I call you?",
-            "age": "Could you please tell me your age?",
-            "gender": "What's your gender? You can say male, female, or other.",
-            "symptoms": "What symptoms or health concerns brought you in today?",
-            "duration": "How long have you been experiencing these symptoms?",
-            "medications": "Are you currently taking any medications? If none, just say 'none'.",
-            "allergies": "Do you have any allergies I should know about? If none, just say 'none'.",
-            "summary": "Let me prepare your medical summary now.",
-            "complete": "Your intake is complete!"
-        }
-        
-        return fallback_responses.get(next_step, "Could you please provide that information?")
+        return _RETRY_RESPONSES.get(next_step, "Could you please provide that information?")
     
-    def _determine_next_step(self, current_data: IntakeData) -> str:
-        """Determine the next step in the intake process"""
-        step_order = [
-            "name", "age", "gender", "symptoms", 
-            "duration", "medications", "allergies", "summary"
-        ]
-        
-        # Check what data we have and what's missing
-        if not current_data.name:
+    def _determine_next_step(self, current_data: IntakeData, extracted_data: Dict[str, Any] = None) -> str:
+        """Determine the next step from the intake data plus anything just extracted"""
+        extracted_data = extracted_data or {}
+        # Don't treat greeting as name data
+        if extracted_data.get("is_greeting"):
             return "name"
-        elif not current_data.age:
-            return "age"
-        elif not current_data.gender:
-            return "gender"
-        elif not current_data.symptoms:
-            return "symptoms"
-        elif not current_data.duration:
-            return "duration"
-        elif not current_data.medications:
-            return "medications"
-        elif not current_data.allergies:
-            return "allergies"
-        else:
-            return "summary"
-    
-    async def _extract_step_data(self, message: str, current_step: str) -> Dict[str, Any]:
-        """Extract specific data based on the current step"""
-        
-        prompts = {
-            "name": f"Extract ONLY the person's name from this message: '{message}'. If it's just a greeting (hi, hello, etc.) with no name, respond with exactly 'GREETING'. Respond with only the name or the word 'GREETING', nothing else.",
-            "age": f"Extract ONLY the age number from this message: '{message}'. If no age is mentioned, respond with exactly 'NO_AGE'. Respond with only a number or 'NO_AGE'.",
-            "gender": f"Extract ONLY the gender from this message: '{message}'. Respond with only 'male', 'female', 'other', or 'NO_GENDER'.",
-            "symptoms": f"Extract and briefly summarize medical symptoms from: '{message}'. If no symptoms mentioned, respond with exactly 'NO_SYMPTOMS'.",
-            "duration": f"Extract how long symptoms lasted from: '{message}'. If no duration mentioned, respond with exactly 'NO_DURATION'.",
-            "medications": f"Extract medications from: '{message}'. If none mentioned, respond with exactly 'NO_MEDICATIONS'.",
-            "allergies": f"Extract allergies from: '{message}'. If none mentioned, respond with exactly 'NO_ALLERGIES'."
-        }
         
-        if current_step not in prompts:
+        # First field still missing, with fresh extractions taking precedence
+        for field in _INTAKE_FIELDS:
+            if not (extracted_data.get(field) or getattr(current_data, field)):
+                return field
+        return "summary"
+    
+    async def _extract_all_remaining(self, message: str, remaining: List[str]) -> Dict[str, Any]:
+        """Extract the given still-missing intake fields from message with one call"""
+        if not remaining:
             return {}
         
+        prompt = _EXTRACTION_PROMPT.format(fields=", ".join(remaining), message=message)
         try:
-            prompt = prompts[current_step]
-            response = self.model.generate_content(prompt)
-            extracted_value = response.text.strip()
-            
-            # Handle different responses
-            if extracted_value in ["GREETING", "NO_AGE", "NO_GENDER", "NO_SYMPTOMS", "NO_DURATION", "NO_MEDICATIONS", "NO_ALLERGIES"]:
-                # Don't update data, just return empty
-                return {}
-            
-            # Format the extracted data based on step
-            if current_step == "age":
-                try:
-                    age = int(re.search(r'\d+', extracted_value).group())
-                    return {"age": age, "current_step": self._determine_next_step_name(current_step)}
-                except:
-                    return {}
-            elif current_step == "gender":
-                gender = extracted_value.lower()
-                if gender in ["male", "female", "other"]:
-                    return {"gender": gender, "current_step": self._determine_next_step_name(current_step)}
-                return {}
-            else:
-                return {current_step: extracted_value, "current_step": self._determine_next_step_name(current_step)}
-                
+            result = orjson.loads(await self._cached_generate(prompt, self._extraction_request))
         except Exception as e:
-            print(f"Error extracting data for {current_step}: {e}")
+            logger.warning("Error extracting intake fields: %s", e)
             return {}
+        return self._coerce_intake_fields(result, remaining)
     
-    def _determine_next_step_name(self, current_step: str) -> str:
-        """Get the next step name"""
-        step_order = [
-            "name", "age", "gender", "symptoms", 
-            "duration", "medications", "allergies", "summary"
-        ]
-        
-        try:
-            current_index = step_order.index(current_step)
-            if current_index < len(step_order) - 1:
-                return step_order[current_index + 1]
-            else:
-                return "complete"
-        except ValueError:
-            return "name"
-    
-    async def _generate_response(self, message: str, current_data: IntakeData, next_step: str) -> str:
-        """Generate appropriate response based on the conversation context"""
-        
-        # Handle greetings when we're asking for name
-        if current_data.current_step == "name" and message.lower().strip() in ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]:
-            return "Hello! Nice to meet you. What's your name?"
-        
-        step_questions = {
-            "age": "Thank you! How old are you?",
-            "gender": "What's your gender? (male/female/other)",
-            "symptoms": "Could you describe your main symptoms or concerns? Take your time and be as detailed as you'd like.",
-            "duration": "How long have you been experiencing these symptoms?",
-            "medications": "Are you currently taking any medications? If none, just say 'none'.",
-            "allergies": "Do you have any allergies I should know about? If none, just say 'none'.",
-            "summary": "Thank you for sharing all that information. Let me create a summary for your doctor.",
-            "complete": "Perfect! I have all the information I need. Redirecting you to the summary page..."
-        }
-        
-        # If we have extracted some data, thank them and move to next question
-        if next_step in step_questions and next_step != current_data.current_step:
-            return step_questions[next_step]
-        
-        # If we're stuck on the same step, ask clarifying question
-        if current_data.current_step == "name":
-            return "I'd like to get your name for the medical records. What should I call you?"
-        elif current_data.current_step == "age":
-            return "Could you please tell me your age?"
-        elif current_data.current_step == "gender":
-            return "What's your gender? You can say male, female, or other."
-        elif current_data.current_step == "symptoms":
-            return "What symptoms or health concerns brought you in today?"
-        elif current_data.current_step == "duration":
-            return "How long have you been experiencing these symptoms?"
-        elif current_data.current_step == "medications":
-            return "Are you currently taking any medications?"
-        elif current_data.current_step == "allergies":
-            return "Do you have any allergies I should know about?"
-        
-        # Fallback to AI response
-        try:
-            context = f"""
-            You are a friendly medical intake assistant. The patient just said: "{message}"
-            Current step: {current_data.current_step}
-            Respond briefly and helpfully to guide them to provide the needed information.
-            """
-            
-            response = self.model.generate_content(context)
-            return response.text.strip()
-        except Exception as e:
-            return "Could you please provide that information again?"
-
-    async def _generate_friendly_response(self, message: str, current_data: IntakeData, next_step: str) -> str:
-        """Generate a friendly, doctor-like response"""
-        
-        try:
-            context = f"""
-            You are Dr. Sarah, a warm and caring family physician. Respond to the patient in a friendly, professional manner.
-            
-            Patient just said: "{message}"
-            Current step: {current_data.current_step}
-            Next step needed: {next_step}
-            
-            Patient info so far:
-            - Name: {current_data.name or 'Not provided'}
-            - Age: {current_data.age or 'Not provided'}
-            - Gender: {current_data.gender or 'Not provided'}
-            - Symptoms: {current_data.symptoms or 'Not provided'}
-            
-            Respond warmly and guide them to the next question. Keep it conversational and caring.
-            """
-            
-            response = self.model.generate_content(context)
-            return response.text.strip()
-            
-        except Exception as e:
-            print(f"Error generating friendly response: {e}")
-            return self._get_default_friendly_response(next_step, current_data)
-    
-    def _get_default_friendly_response(self, next_step: str, current_data: IntakeData) -> str:
-        """Fallback friendly responses"""
-        responses = {
-            "name": "Hello! I'm Dr. Sarah. I'm here to help you today. May I have your name please?",
-            "age": f"Nice to meet you, {current_data.name or 'there'}! How old are you?",
-            "gender": "Thank you! And what's your gender - male, female, or other?",
-            "symptoms": "I'd like to understand what's bringing you in today. Can you tell me about your symptoms or concerns?",
-            "duration": "I see. How long have you been experiencing these symptoms?",
-            "medications": "Thank you for sharing that. Are you currently taking any medications?",
-            "allergies": "And do you have any allergies I should be aware of?",
-            "summary": "Thank you for providing all that information. Let me summarize what we've discussed and prepare a report for your healthcare provider.",
-            "complete": "Perfect! I have everything I need. Your intake is complete."
-        }
-        return responses.get(next_step, "Thank you. Let's continue with your intake.")
+    def _coerce_intake_fields(self, result: Dict[str, Any], fields) -> Dict[str, Any]:
+        """Keep the requested fields the model filled in with usable values"""
+        extracted = {}
+        for field in fields:
+            value = result.get(field)
+            if field == "age":
+                if isinstance(value, int) and 1 <= value <= 150:
+                    extracted["age"] = value
+            elif field == "gender":
+                if value in ("male", "female", "other"):
+                    extracted["gender"] = value
+            elif isinstance(value, str) and value.strip():
+                extracted[field] = value.strip()
+        return extracted
     
     async def generate_medical_summary(self, intake_data: IntakeData) -> MedicalSummaryResponse:
         """Generate a comprehensive medical summary from intake data"""
+        cache_key = self._summary_cache_key(intake_data)
+        cached = self._summary_cache.get(cache_key)
+        if cached is not None:
+            return cached.model_copy(update={"created_at": datetime.now()})
+        
         try:
-            # Create a detailed prompt for medical summary generation
-            prompt = f"""
-            You are Dr. Sarah, an experienced family physician with 15 years of practice. Create a comprehensive medical summary based on the patient intake information below. Be intelligent, practical, and provide specific recommendations.
-
-            Patient Information:
-            - Name: {intake_data.name or 'Not provided'}
-            - Age: {intake_data.age or 'Not provided'}
-            - Gender: {intake_data.gender or 'Not provided'}
-            - Chief Complaint: {intake_data.symptoms or 'Not provided'}
-            - Duration: {intake_data.duration or 'Not provided'}
-            - Current Medications: {intake_data.medications or 'None reported'}
-            - Allergies: {intake_data.allergies or 'None reported'}
-
-            Based on the symptoms, age, and presentation, provide:
-
-            1. **CHIEF COMPLAINT**: Clear statement of the main issue
-            2. **HISTORY OF PRESENT ILLNESS**: Detailed analysis of symptoms
-            3. **CURRENT MEDICATIONS**: List what they're taking
-            4. **ALLERGIES**: Note any allergies
-            5. **CLINICAL ASSESSMENT**: Your professional medical opinion about the likely condition(s)
-            6. **RECOMMENDED MEDICATIONS**: Suggest specific over-the-counter or prescription medications with dosages
-            7. **HOME REMEDIES & LIFESTYLE**: Practical home care suggestions
-            8. **WHEN TO SEEK IMMEDIATE CARE**: Red flag symptoms to watch for
-            9. **FOLLOW-UP RECOMMENDATIONS**: Specific timeline for follow-up care
-
-            Be specific about:
-            - Medication names, dosages, and frequencies
-            - Duration of treatment
-            - Specific symptoms that would warrant immediate medical attention
-            - Practical home remedies that are evidence-based
-            - Expected timeline for improvement
-
-            Format as a professional medical note but make it intelligent and actionable.
-            """
+            # The instructions live on _summary_request; only the patient details are sent per call
+            values = (
+                intake_data.name or 'Not provided',
+                str(intake_data.age or 'Not provided'),
+                intake_data.gender or 'Not provided',
+                intake_data.symptoms or 'Not provided',
+                intake_data.duration or 'Not provided',
+                intake_data.medications or 'None reported',
+                intake_data.allergies or 'None reported',
+            )
+            prompt = "".join(chain.from_iterable(zip(_SUMMARY_PROMPT_LABELS, values))) + "\n"
+
+            # One keyword pass feeds every rule-based section of the summary
+            symptom_tags = _classify_symptoms((intake_data.symptoms or "").lower())
 
             # Try to use AI for summary generation
             try:
-                response = self.model.generate_content(prompt)
+                response = await self._generate(self._summary_request, prompt)
                 ai_summary = response.text.strip()
+                ai_generated = True
             except Exception as ai_error:
-                print(f"AI summary generation failed: {ai_error}")
+                logger.warning("AI summary generation failed: %s", ai_error)
                 # Fallback to intelligent structured summary
-                ai_summary = self._generate_intelligent_fallback_summary(intake_data)
+                ai_summary = self._generate_intelligent_fallback_summary(intake_data, symptom_tags)
+                ai_generated = False
 
-            return MedicalSummaryResponse(
+            summary = MedicalSummaryResponse(
                 id=1,  # Temporary ID for non-persisted summary
                 patient_id=1,  # Temporary patient ID
                 summary_text=ai_summary,
@@ -795,140 +1070,92 @@ Let's start - could you please tell me your name?"""
                     chief_complaint=intake_data.symptoms or "Not specified",
                     symptoms=[intake_data.symptoms] if intake_data.symptoms else [],
                     duration=intake_data.duration or "Not specified",
-                    severity=self._assess_severity(intake_data.symptoms, intake_data.duration),
+                    severity=self._assess_severity(intake_data.symptoms, intake_data.duration, symptom_tags),
                     associated_symptoms=[],
                     medical_history="Patient reported chief complaint as documented",
                     current_medications=[intake_data.medications] if intake_data.medications and intake_data.medications.lower() != 'none' else [],
                     allergies=[intake_data.allergies] if intake_data.allergies and intake_data.allergies.lower() != 'none' else [],
-                    recommendations=self._generate_intelligent_recommendations(intake_data)
+                    recommendations=self._generate_intelligent_recommendations(symptom_tags)
                 ),
                 icd_codes=[],
                 created_at=datetime.now()
             )
+            # Fallback summaries aren't kept so the next request retries Gemini
+            if ai_generated:
+                self._summary_cache[cache_key] = summary
+            return summary
 
         except Exception as e:
-            print(f"Error generating medical summary: {e}")
+            logger.error("Error generating medical summary: %s", e)
             return self._generate_emergency_fallback_summary(intake_data)
 
+    def _summary_cache_key(self, intake_data: IntakeData) -> bytes:
+        """Digest of the intake answers, ignoring case and surrounding whitespace"""
+        fields = (
+            intake_data.name, intake_data.age, intake_data.gender, intake_data.symptoms,
+            intake_data.duration, intake_data.medications, intake_data.allergies,
+        )
+        canonical = "|".join(str(value or "").strip().lower() for value in fields)
+        return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
     def _generate_fallback_summary(self, intake_data: IntakeData) -> str:
         """Generate a structured summary without AI when API is unavailable"""
-        return f"""
-MEDICAL INTAKE SUMMARY
-Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-
-PATIENT INFORMATION:
-Name: {intake_data.name or 'Not provided'}
-Age: {intake_data.age or 'Not provided'}
-Gender: {intake_data.gender or 'Not provided'}
-
-CHIEF COMPLAINT:
-{intake_data.symptoms or 'Not specified'}
-
-HISTORY OF PRESENT ILLNESS:
-Patient reports {intake_data.symptoms or 'symptoms'} for a duration of {intake_data.duration or 'unspecified time period'}.
-
-CURRENT MEDICATIONS:
-{intake_data.medications or 'None reported'}
-
-ALLERGIES:
-{intake_data.allergies or 'None reported'}
-
-ASSESSMENT:
-Patient presents with chief complaint as documented above. Further evaluation by healthcare provider recommended.
-
-PLAN:
-1. Review of symptoms and physical examination
-2. Consider appropriate diagnostic workup based on clinical presentation
-3. Follow-up as clinically indicated
-4. Patient education regarding symptoms and when to seek care
-
-RECOMMENDATIONS:
-- Schedule appointment with primary care physician
-- Monitor symptoms and return if worsening
-- Seek immediate care if symptoms become severe
-        """.strip()
-
-    def _generate_intelligent_fallback_summary(self, intake_data: IntakeData) -> str:
+        return _FALLBACK_SUMMARY_TEMPLATE.format_map({
+            "date": datetime.now().strftime('%Y-%m-%d %H:%M'),
+            "name": intake_data.name or 'Not provided',
+            "age": intake_data.age or 'Not provided',
+            "gender": intake_data.gender or 'Not provided',
+            "chief_complaint": intake_data.symptoms or 'Not specified',
+            "symptoms": intake_data.symptoms or 'symptoms',
+            "duration": intake_data.duration or 'unspecified time period',
+            "medications": intake_data.medications or 'None reported',
+            "allergies": intake_data.allergies or 'None reported',
+        })
+
+    def _generate_intelligent_fallback_summary(self, intake_data: IntakeData, symptom_tags: set) -> str:
         """Generate an intelligent fallback summary with specific recommendations"""
-        symptoms = (intake_data.symptoms or "").lower()
         age = intake_data.age or 0
-        duration = (intake_data.duration or "").lower()
-        
-        # Intelligent assessment based on symptoms
-        assessment = self._get_intelligent_assessment(symptoms, age, duration)
-        medications = self._get_medication_recommendations(symptoms, age)
-        home_remedies = self._get_home_remedies(symptoms)
-        red_flags = self._get_red_flag_symptoms(symptoms)
-        
-        return f"""
-MEDICAL INTAKE SUMMARY
-Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-
-PATIENT INFORMATION:
-Name: {intake_data.name or 'Not provided'}
-Age: {intake_data.age or 'Not provided'}
-Gender: {intake_data.gender or 'Not provided'}
-
-CHIEF COMPLAINT:
-{intake_data.symptoms or 'Not specified'}
-
-HISTORY OF PRESENT ILLNESS:
-{age}-year-old {intake_data.gender or 'patient'} presents with {intake_data.symptoms or 'symptoms'} for {intake_data.duration or 'unspecified duration'}. {assessment['description']}
-
-CURRENT MEDICATIONS:
-{intake_data.medications or 'None reported'}
-
-ALLERGIES:
-{intake_data.allergies or 'None reported'}
-
-CLINICAL ASSESSMENT:
-{assessment['diagnosis']}
-
-RECOMMENDED MEDICATIONS:
-{medications}
-
-HOME REMEDIES & LIFESTYLE RECOMMENDATIONS:
-{home_remedies}
-
-WHEN TO SEEK IMMEDIATE CARE:
-{red_flags}
-
-FOLLOW-UP RECOMMENDATIONS:
-- Follow up with primary care physician within {assessment['follow_up_timeline']}
-- Return if symptoms worsen or new symptoms develop
-- Expected improvement timeline: {assessment['expected_improvement']}
-
-ADDITIONAL NOTES:
-{assessment['additional_notes']}
-        """.strip()
-
-    def _assess_severity(self, symptoms: str, duration: str) -> str:
+        condition = self._match_condition(symptom_tags)
+        
+        return _INTELLIGENT_SUMMARY_TEMPLATE.format_map({
+            **self._get_intelligent_assessment(condition),
+            "date": datetime.now().strftime('%Y-%m-%d %H:%M'),
+            "name": intake_data.name or 'Not provided',
+            "age": intake_data.age or 'Not provided',
+            "gender": intake_data.gender or 'Not provided',
+            "chief_complaint": intake_data.symptoms or 'Not specified',
+            "age_years": age,
+            "patient": intake_data.gender or 'patient',
+            "symptoms": intake_data.symptoms or 'symptoms',
+            "duration": intake_data.duration or 'unspecified duration',
+            "medications": intake_data.medications or 'None reported',
+            "allergies": intake_data.allergies or 'None reported',
+            "medication_advice": self._get_medication_recommendations(condition, age),
+            "home_remedies": self._get_home_remedies(condition),
+            "red_flags": self._get_red_flag_symptoms(condition),
+        })
+
+    def _assess_severity(self, symptoms: str, duration: str, symptom_tags: set) -> str:
         """Assess severity based on symptoms and duration"""
         if not symptoms:
             return "moderate"
         
-        symptoms_lower = symptoms.lower()
-        duration_lower = (duration or "").lower()
-        
         # Severe symptoms
-        if any(word in symptoms_lower for word in ["chest pain", "difficulty breathing", "severe pain", "blood", "fever over 101", "vomiting"]):
+        if "severe" in symptom_tags:
             return "severe"
         
         # Mild symptoms
-        if any(word in symptoms_lower for word in ["mild", "slight", "minor"]) or any(word in duration_lower for word in ["few hours", "today", "1 day"]):
+        if "mild" in symptom_tags or _SHORT_DURATION_PATTERN.search((duration or "").lower()):
             return "mild"
         
         return "moderate"
 
-    def _generate_intelligent_recommendations(self, intake_data: IntakeData) -> List[str]:
+    def _generate_intelligent_recommendations(self, symptom_tags: set) -> List[str]:
         """Generate intelligent recommendations based on symptoms"""
-        symptoms = (intake_data.symptoms or "").lower()
-        age = intake_data.age or 0
-        
         recommendations = []
         
         # Common cold/cough recommendations
-        if any(word in symptoms for word in ["cold", "cough", "congestion", "runny nose"]):
+        if "respiratory" in symptom_tags:
             recommendations.extend([
                 "Stay hydrated - drink plenty of fluids",
                 "Use a humidifier or breathe steam from hot shower",
@@ -938,7 +1165,7 @@ ADDITIONAL NOTES:
             ])
         
         # Fever recommendations
-        if "fever" in symptoms:
+        if "fever" in symptom_tags:
             recommendations.extend([
                 "Monitor temperature regularly",
                 "Use fever reducers as directed (acetaminophen or ibuprofen)",
@@ -947,7 +1174,7 @@ ADDITIONAL NOTES:
             ])
         
         # Headache recommendations
-        if "headache" in symptoms:
+        if "headache" in symptom_tags:
             recommendations.extend([
                 "Apply cold or warm compress to head/neck",
                 "Stay hydrated",
@@ -964,154 +1191,33 @@ ADDITIONAL NOTES:
         
         return recommendations
 
-    def _get_intelligent_assessment(self, symptoms: str, age: int, duration: str) -> Dict[str, str]:
+    def _match_condition(self, symptom_tags: set) -> Optional[str]:
+        """Pick the condition whose advice the rule-based summary sections use"""
+        if _COLD_AND_COUGH <= symptom_tags:
+            return "cold_cough"
+        elif "fever" in symptom_tags:
+            return "fever"
+        elif "headache" in symptom_tags:
+            return "headache"
+        return None
+
+    def _get_intelligent_assessment(self, condition: Optional[str]) -> Dict[str, str]:
         """Get intelligent assessment based on symptoms"""
-        if "cold" in symptoms and "cough" in symptoms:
-            return {
-                "description": "This appears to be consistent with an upper respiratory tract infection (common cold).",
-                "diagnosis": "Likely viral upper respiratory infection (common cold) based on symptom presentation and duration.",
-                "follow_up_timeline": "3-5 days if symptoms persist or worsen",
-                "expected_improvement": "Symptoms typically improve within 7-10 days",
-                "additional_notes": "Viral infections are self-limiting but symptom management is important for comfort."
-            }
-        elif "fever" in symptoms:
-            return {
-                "description": "Patient presents with fever which may indicate an infectious process.",
-                "diagnosis": "Febrile illness - requires further evaluation to determine underlying cause.",
-                "follow_up_timeline": "24-48 hours if fever persists",
-                "expected_improvement": "Depends on underlying cause",
-                "additional_notes": "Monitor temperature and associated symptoms closely."
-            }
-        elif "headache" in symptoms:
-            return {
-                "description": "Patient reports headache which could be tension-type or other etiology.",
-                "diagnosis": "Headache - likely tension-type based on presentation.",
-                "follow_up_timeline": "1 week if headaches persist or worsen",
-                "expected_improvement": "Should improve with rest and appropriate treatment",
-                "additional_notes": "Consider triggers such as stress, dehydration, or sleep deprivation."
-            }
-        else:
-            return {
-                "description": "Patient presents with symptoms requiring clinical evaluation.",
-                "diagnosis": "Symptoms require further assessment for proper diagnosis.",
-                "follow_up_timeline": "3-5 days",
-                "expected_improvement": "Variable depending on underlying condition",
-                "additional_notes": "Comprehensive evaluation recommended."
-            }
+        return _ASSESSMENTS.get(condition, _DEFAULT_ASSESSMENT)
 
-    def _get_medication_recommendations(self, symptoms: str, age: int) -> str:
+    def _get_medication_recommendations(self, condition: Optional[str], age: int) -> str:
         """Get medication recommendations based on symptoms and age"""
-        if "cold" in symptoms and "cough" in symptoms:
-            if age >= 18:
-                return """
-• Acetaminophen 650mg every 6 hours for aches and fever (max 3000mg/day)
-• Ibuprofen 400mg every 6-8 hours for inflammation and pain (max 1200mg/day)
-• Pseudoephedrine 30mg every 6 hours for nasal congestion (if no contraindications)
-• Dextromethorphan 15mg every 4 hours for dry cough
-• Guaifenesin 200-400mg every 4 hours for productive cough
-• Lozenges or throat sprays for sore throat
-                """.strip()
-            else:
-                return "Age-appropriate pediatric formulations of acetaminophen or ibuprofen as directed by weight/age charts."
-        
-        elif "fever" in symptoms:
-            return """
-• Acetaminophen 650mg every 6 hours (max 3000mg/day)
-• Ibuprofen 400mg every 6-8 hours (max 1200mg/day)
-• Alternate between acetaminophen and ibuprofen if needed
-            """.strip()
-        
-        elif "headache" in symptoms:
-            return """
-• Acetaminophen 650mg every 6 hours (max 3000mg/day)
-• Ibuprofen 400mg every 6-8 hours (max 1200mg/day)
-• Aspirin 500mg every 4-6 hours (if no contraindications)
-            """.strip()
-        
-        return "Consult healthcare provider for appropriate medication recommendations."
+        if condition == "cold_cough" and age < 18:
+            return _MEDICATION_ADVICE_CHILD
+        return _MEDICATION_ADVICE.get(condition, _MEDICATION_ADVICE_DEFAULT)
 
-    def _get_home_remedies(self, symptoms: str) -> str:
+    def _get_home_remedies(self, condition: Optional[str]) -> str:
         """Get home remedies based on symptoms"""
-        if "cold" in symptoms and "cough" in symptoms:
-            return """
-• Honey and warm water for cough (1-2 teaspoons of honey in warm water)
-• Steam inhalation 2-3 times daily
-• Warm salt water gargles (1/2 teaspoon salt in warm water)
-• Increase fluid intake (water, herbal teas, clear broths)
-• Use a humidifier or vaporizer
-• Elevate head while sleeping
-• Avoid dairy products which may increase mucus production
-            """.strip()
-        
-        elif "fever" in symptoms:
-            return """
-• Cool compresses on forehead and wrists
-• Lukewarm baths or showers
-• Light, breathable clothing
-• Increased fluid intake
-• Rest in a cool environment
-            """.strip()
-        
-        elif "headache" in symptoms:
-            return """
-• Apply cold compress to forehead for 15-20 minutes
-• Gentle neck and shoulder massage
-• Rest in quiet, dark room
-• Stay hydrated
-• Practice relaxation techniques
-• Regular sleep schedule
-            """.strip()
-        
-        return "Rest, hydration, and monitoring of symptoms."
+        return _HOME_REMEDIES.get(condition, _HOME_REMEDIES_DEFAULT)
 
-    def _get_red_flag_symptoms(self, symptoms: str) -> str:
+    def _get_red_flag_symptoms(self, condition: Optional[str]) -> str:
         """Get red flag symptoms that require immediate medical attention"""
-        if "cold" in symptoms and "cough" in symptoms:
-            return """
-SEEK IMMEDIATE MEDICAL ATTENTION IF:
-• Difficulty breathing or shortness of breath
-• Chest pain or pressure
-• High fever (>101.5°F/38.6°C) for more than 3 days
-• Coughing up blood or pink-tinged sputum
-• Severe headache with neck stiffness
-• Persistent vomiting
-• Signs of dehydration
-• Symptoms significantly worsen after initial improvement
-            """.strip()
-        
-        elif "fever" in symptoms:
-            return """
-SEEK IMMEDIATE MEDICAL ATTENTION IF:
-• Temperature >103°F (39.4°C)
-• Difficulty breathing
-• Severe headache with neck stiffness
-• Persistent vomiting
-• Signs of dehydration
-• Confusion or altered mental state
-• Chest pain
-            """.strip()
-        
-        elif "headache" in symptoms:
-            return """
-SEEK IMMEDIATE MEDICAL ATTENTION IF:
-• Sudden, severe headache ("worst headache of life")
-• Headache with fever and neck stiffness
-• Headache with vision changes
-• Headache with confusion or altered mental state
-• Headache after head injury
-• Progressively worsening headache
-            """.strip()
-        
-        return """
-SEEK IMMEDIATE MEDICAL ATTENTION IF:
-• Severe or worsening symptoms
-• Difficulty breathing
-• Chest pain
-• High fever
-• Severe headache
-• Persistent vomiting
-• Signs of dehydration
-        """.strip()
+        return _RED_FLAGS.get(condition, _RED_FLAGS_DEFAULT)
 
     def _generate_emergency_fallback_summary(self, intake_data: IntakeData) -> MedicalSummaryResponse:
         """Emergency fallback when all other methods fail"""
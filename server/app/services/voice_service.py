@@ -1,6 +1,5 @@
 import openai
-import io
-import tempfile
+from functools import cached_property
 from typing import BinaryIO
 
 from app.utils.config import get_settings
@@ -8,24 +7,22 @@ from app.utils.config import get_settings
 class VoiceService:
     def __init__(self):
         self.settings = get_settings()
-        openai.api_key = self.settings.openai_api_key
-        self.client = openai.OpenAI()
     
-    async def transcribe_audio(self, audio_data: bytes) -> str:
-        """Transcribe audio using OpenAI Whisper API"""
+    @cached_property
+    def client(self) -> openai.AsyncOpenAI:
+        """OpenAI client, built on the first transcription rather than at startup"""
+        return openai.AsyncOpenAI(api_key=self.settings.openai_api_key)
+    
+    async def transcribe_audio(self, audio_file: BinaryIO, filename: str = "audio.wav") -> str:
+        """Transcribe audio from a file-like object using OpenAI Whisper API"""
         try:
-            # Create a temporary file for the audio data
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file.flush()
-                
-                # Open the file for reading
-                with open(temp_file.name, "rb") as audio_file:
-                    transcript = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        response_format="text"
-                    )
+            # Hand the upload straight to the SDK; the filename lets Whisper
+            # infer the audio format
+            transcript = await self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, audio_file),
+                response_format="text"
+            )
             
             return transcript
             
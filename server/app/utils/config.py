@@ -1,13 +1,28 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
+from functools import lru_cache
 import os
 
 class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./medq.db"
+    # Connections shared by all workers; keep below Postgres max_connections
+    # (100 by default) minus its reserved superuser slots
+    db_max_connections: int = 90
+    # Per-worker pool; derived from db_max_connections / web_concurrency when unset
+    db_pool_size: Optional[int] = None
+    db_max_overflow: Optional[int] = None
+    db_pool_recycle: int = 1800  # seconds
+    db_statement_cache_size: int = 512  # 0 behind PgBouncer transaction pooling
     
     # Google Gemini
     gemini_api_key: str = ""
+    # Optional pool of keys rotated on quota errors; falls back to gemini_api_key
+    gemini_api_keys: List[str] = Field(default_factory=list)
+    
+    # OpenAI (Whisper transcription)
+    openai_api_key: Optional[str] = None
     
     # Security
     secret_key: str = "your-secret-key-here"
@@ -15,7 +30,10 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 30
     
     # CORS
-    allowed_origins: list = ["http://localhost:3000"]
+    allowed_origins: List[str] = Field(default_factory=lambda: ["http://localhost:3000"])
+    
+    # Server processes (WEB_CONCURRENCY); also sizes the per-worker DB pool
+    web_concurrency: int = Field(default_factory=lambda: 2 * (os.cpu_count() or 1) + 1)
     
     # Environment
     environment: str = "development"
@@ -24,5 +42,7 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    # Parsing .env and validating is done once per process
     return Settings()
@@ -0,0 +1,246 @@
+import asyncio
+import google.ai.generativelanguage as glm
+import pytest
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
+
+from app.services import ai_service
+from app.services.ai_service import AIService
+from app.utils.config import Settings
+
+@pytest.fixture
+def service():
+    """A fresh service per test, so caches and breaker state don't leak"""
+    return AIService()
+
+@pytest.fixture
+def make_service(monkeypatch):
+    """Build a service from the given settings instead of the environment"""
+    def make(**settings):
+        monkeypatch.setattr(ai_service, "get_settings", lambda: Settings(**settings))
+        return AIService()
+    return make
+
+class FakeClient:
+    """Stands in for GenerativeServiceAsyncClient, replying or failing every call"""
+    built = []
+    
+    def __init__(self, client_options=None, fail=None, reply="ok"):
+        self.api_key = (client_options or {}).get("api_key")
+        self.fail = fail
+        self.reply = reply
+        self.gate = None  # an asyncio.Event to hold calls until it is set
+        self.requests = []
+        FakeClient.built.append(self)
+    
+    async def generate_content(self, request):
+        self.requests.append(request)
+        if self.gate:
+            await self.gate.wait()
+        if self.fail:
+            raise self.fail
+        return glm.GenerateContentResponse(candidates=[
+            glm.Candidate(content=glm.Content(parts=[glm.Part(text=self.reply)]))
+        ])
+
+@pytest.mark.parametrize("step", ["medications", "allergies"])
+@pytest.mark.parametrize("reply", ["none", "No known allergies", "I don't take anything", "not taking any meds"])
+def test_none_answers_are_recorded_as_none(service, step, reply):
+    """Any phrasing of "nothing to report" is stored as "none" """
+    assert service._smart_extract_data(reply, reply.lower(), step) == {step: "none"}
+
+def test_real_answers_are_kept_verbatim(service):
+    """Replies naming something are not folded into "none" """
+    reply = "No penicillin, but I take ibuprofen"
+    assert service._smart_extract_data(reply, reply.lower(), "medications") == {"medications": reply}
+
+@pytest.mark.parametrize("reply, gender", [
+    ("I'm female", "female"),
+    ("i'm a woman", "female"),
+    ("I'm non-binary", "other"),
+    ("I'm male", "male"),
+    ("m", "male"),
+    ("F", "female"),
+    ("prefer not to say", "other"),
+])
+def test_gender_answers(service, reply, gender):
+    """The "m" in "I'm" is not read as male"""
+    assert service._smart_extract_data(reply, reply.lower(), "gender") == {"gender": gender}
+
+@pytest.mark.parametrize("reply, expected", [
+    ("45", {"age": 45}),
+    ("I'm 45 years old", {"age": 45}),
+    ("0", {}),
+    ("1000", {}),
+    ("not telling", {}),
+])
+def test_age_answers(service, reply, expected):
+    assert service._smart_extract_data(reply, reply.lower(), "age") == expected
+
+def test_single_listed_key_is_used_without_global_key(make_service, monkeypatch):
+    """GEMINI_API_KEYS with one entry works even when GEMINI_API_KEY is empty"""
+    FakeClient.built = []
+    monkeypatch.setattr(ai_service.glm, "GenerativeServiceAsyncClient", FakeClient)
+    service = make_service(gemini_api_key="", gemini_api_keys=["key-a"])
+    
+    assert asyncio.run(service._generate(service._summary_request, "hi")).text == "ok"
+    assert [client.api_key for client in FakeClient.built] == ["key-a"]
+    request = FakeClient.built[0].requests[0]
+    assert request.contents[0].parts[0].text == "hi"
+    assert request.system_instruction.parts[0].text == ai_service._SUMMARY_INSTRUCTIONS
+    # The shared template is copied, never mutated
+    assert not service._summary_request.contents
+
+def test_quota_error_fails_over_to_next_key(make_service):
+    """A key over quota cools down and later calls go straight to the next one"""
+    service = make_service(gemini_api_keys=["key-a", "key-b"])
+    service._key_clients = {0: FakeClient(fail=ResourceExhausted("quota")), 1: FakeClient(reply="from b")}
+    
+    assert asyncio.run(service._generate(service._chat_request, "hi")).text == "from b"
+    assert asyncio.run(service._generate(service._chat_request, "again")).text == "from b"
+    assert len(service._key_clients[0].requests) == 1
+    assert len(service._key_clients[1].requests) == 2
+
+def test_all_keys_over_quota_raises_quota_error(make_service):
+    service = make_service(gemini_api_keys=["key-a", "key-b"])
+    service._key_clients = {i: FakeClient(fail=ResourceExhausted("quota")) for i in range(2)}
+    
+    with pytest.raises(ResourceExhausted):
+        asyncio.run(service._generate(service._chat_request, "hi"))
+    assert all(len(client.requests) == 1 for client in service._key_clients.values())
+
+def test_other_errors_do_not_rotate_keys(make_service):
+    service = make_service(gemini_api_keys=["key-a", "key-b"])
+    service._key_clients = {0: FakeClient(fail=InvalidArgument("bad request")), 1: FakeClient()}
+    
+    with pytest.raises(InvalidArgument):
+        asyncio.run(service._generate(service._chat_request, "hi"))
+    assert not service._key_clients[1].requests
+
+def test_circuit_breaker_states(make_service, monkeypatch):
+    """closed -> open after repeated quota errors -> half-open probe -> closed"""
+    now = [1000.0]
+    monkeypatch.setattr(ai_service, "_clock", lambda: now[0])
+    service = make_service(gemini_api_key="key-a")
+    client = service._key_clients[0] = FakeClient(fail=ResourceExhausted("quota"))
+    threshold = ai_service._CB_FAILURE_THRESHOLD
+    generate = lambda: service._generate(service._chat_request, "hi")
+    
+    # Closed: every call reaches the API until the threshold is hit
+    for _ in range(threshold):
+        with pytest.raises(ResourceExhausted):
+            asyncio.run(generate())
+    assert len(client.requests) == threshold
+    
+    # Open: calls fail fast without touching the API
+    with pytest.raises(ai_service.CircuitOpenError):
+        asyncio.run(generate())
+    assert len(client.requests) == threshold
+    
+    # Half-open: one probe goes through, and its quota error reopens at once
+    now[0] += ai_service._CB_OPEN_SECONDS
+    with pytest.raises(ResourceExhausted):
+        asyncio.run(generate())
+    with pytest.raises(ai_service.CircuitOpenError):
+        asyncio.run(generate())
+    assert len(client.requests) == threshold + 1
+    
+    # Half-open again: calls made while the probe is pending still fail fast,
+    # and the probe's success closes the circuit
+    now[0] += ai_service._CB_OPEN_SECONDS
+    client.fail = None
+    
+    async def probe_with_concurrent_call():
+        client.gate = asyncio.Event()
+        probe = asyncio.create_task(generate())
+        await asyncio.sleep(0)
+        with pytest.raises(ai_service.CircuitOpenError):
+            await generate()
+        client.gate.set()
+        return await probe
+    assert asyncio.run(probe_with_concurrent_call()).text == "ok"
+    
+    # Closed: calls reach the API again
+    client.gate = None
+    assert asyncio.run(generate()).text == "ok"
+    assert len(client.requests) == threshold + 3
+
+def test_open_circuit_gets_rule_based_reply(service):
+    """The chat flow answers from the fallback while the circuit is open"""
+    service._cb_open_until = float("inf")
+    result = asyncio.run(service.intelligent_medical_conversation("I have a fever"))
+    assert result["fallback_used"] is True
+
+def test_concurrent_identical_prompts_share_one_call(make_service):
+    service = make_service(gemini_api_key="key-a")
+    client = service._key_clients[0] = FakeClient(reply="shared")
+    
+    async def ask_concurrently():
+        client.gate = asyncio.Event()
+        calls = [asyncio.create_task(service._cached_generate("same prompt")) for _ in range(5)]
+        await asyncio.sleep(0)
+        client.gate.set()
+        return await asyncio.gather(*calls)
+    assert asyncio.run(ask_concurrently()) == ["shared"] * 5
+    assert len(client.requests) == 1
+    assert not service._inflight
+
+def test_failed_shared_call_is_not_reused(make_service):
+    """Every waiter sees the failure, and the next call goes upstream again"""
+    service = make_service(gemini_api_key="key-a")
+    client = service._key_clients[0] = FakeClient(fail=InvalidArgument("bad request"))
+    
+    async def ask_concurrently():
+        client.gate = asyncio.Event()
+        calls = [asyncio.create_task(service._cached_generate("same prompt")) for _ in range(3)]
+        await asyncio.sleep(0)
+        client.gate.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+    results = asyncio.run(ask_concurrently())
+    assert all(isinstance(result, InvalidArgument) for result in results)
+    assert len(client.requests) == 1
+    assert not service._inflight
+    
+    client.fail = None
+    client.gate = None
+    assert asyncio.run(service._cached_generate("same prompt")) == "ok"
+    assert len(client.requests) == 2
+
+def _intake_at_symptoms():
+    return ai_service.IntakeData(name="Ann", age=30, gender="female", current_step="symptoms")
+
+def _extraction_requests(client):
+    return [r for r in client.requests if r.generation_config.response_mime_type == "application/json"]
+
+def test_symptom_list_skips_batch_extraction(make_service):
+    """Commas alone don't mean the reply answers several questions"""
+    service = make_service(gemini_api_key="key-a")
+    client = service._key_clients[0] = FakeClient()
+    
+    result = asyncio.run(service.process_intake_message("headache, fever", _intake_at_symptoms()))
+    assert not _extraction_requests(client)
+    assert result["extracted_data"]["symptoms"] == "headache, fever"
+
+def test_batch_extraction_keeps_parsed_answers(make_service):
+    """Later answers come from one call; a parsed current-step answer keeps its rule-based value"""
+    service = make_service(gemini_api_key="key-a")
+    client = service._key_clients[0] = FakeClient(reply='{"age": 54, "gender": "male"}')
+    intake = ai_service.IntakeData(name="Ann", current_step="age")
+    
+    result = asyncio.run(service.process_intake_message("45, male", intake))
+    assert len(_extraction_requests(client)) == 1
+    assert result["extracted_data"]["age"] == 45
+    assert result["extracted_data"]["gender"] == "male"
+
+def test_batch_extraction_narrows_free_text_answers(make_service):
+    """The name is the model's, not the whole sentence the rules would copy"""
+    service = make_service(gemini_api_key="key-a")
+    client = service._key_clients[0] = FakeClient(reply=(
+        '{"name": "John", "age": 45, "gender": "male", "symptoms": "coughing", "duration": "3 days"}'
+    ))
+    intake = ai_service.IntakeData(current_step="name")
+    
+    result = asyncio.run(service.process_intake_message("I'm John, 45, male, coughing for 3 days", intake))
+    assert len(_extraction_requests(client)) == 1
+    assert {k: result["extracted_data"][k] for k in ("name", "age", "gender", "symptoms", "duration")} == {
+        "name": "John", "age": 45, "gender": "male", "symptoms": "coughing", "duration": "3 days",
+    }
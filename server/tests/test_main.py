@@ -1,41 +1,70 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+import jwt
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+# Keeps the app's own startup create_all off disk; requests use the test engine below
+os.environ["DATABASE_URL"] = "sqlite://"
+
 from app.main import app
-from app.models.database import Base, get_db
+from app.models.database import Base, get_async_db, get_async_sessionmaker
+from app.models.schemas import DoctorUser, Patient, RevokedToken
+from app.routes.auth import get_password_hash
+from app.utils.config import get_settings
+
+settings = get_settings()
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Test database: in memory, with every session sharing the one connection
+# so the tables and rows outlive each request
+async_engine = create_async_engine(
+    "sqlite+aiosqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
-Base.metadata.create_all(bind=engine)
+@pytest.fixture(scope="session", autouse=True)
+def create_tables():
+    """Create the schema once for the whole test session"""
+    async def create_all():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    asyncio.run(create_all())
+    yield
+    # Closes the shared connection, whose aiosqlite thread would otherwise
+    # keep the interpreter from exiting
+    asyncio.run(async_engine.dispose())
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_sessionmaker] = lambda: TestingAsyncSessionLocal
 
-client = TestClient(app)
+@pytest.fixture(scope="session")
+def client():
+    """One client for the session, so app startup and shutdown run once"""
+    with TestClient(app) as test_client:
+        yield test_client
 
-def test_root():
+def test_root(client):
     """Test root endpoint"""
     response = client.get("/")
     assert response.status_code == 200
     assert "MedQ API" in response.json()["message"]
 
-def test_health_check():
+def test_health_check(client):
     """Test health check endpoint"""
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
-def test_create_patient():
+def test_create_patient(client):
     """Test patient creation"""
     patient_data = {
         "name": "John Doe",
@@ -53,7 +82,7 @@ def test_create_patient():
     assert data["success"] is True
     assert data["data"]["name"] == "John Doe"
 
-def test_get_patients():
+def test_get_patients(client):
     """Test getting patients list"""
     response = client.get("/api/patients/")
     assert response.status_code == 200
@@ -61,9 +90,102 @@ def test_get_patients():
     assert data["success"] is True
     assert isinstance(data["data"], list)
 
-@pytest.fixture
-def auth_headers():
-    """Create authenticated user for testing"""
+def test_patient_summary_and_pdf_export(client):
+    """Summary lookup 404s without a summary; PDF export still renders"""
+    patient_id = client.post("/api/patients/", json={
+        "name": "Sam Poe",
+        "age": 52,
+        "gender": "male",
+        "symptoms": "Back pain",
+        "duration": "3 days"
+    }).json()["data"]["id"]
+    
+    assert client.get(f"/api/patients/{patient_id}/summary").status_code == 404
+    response = client.get(f"/api/patients/{patient_id}/export/pdf")
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    cached = client.get(
+        f"/api/patients/{patient_id}/export/pdf",
+        headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert cached.status_code == 304
+    assert client.get("/api/patients/999999/export/pdf").status_code == 404
+
+def test_get_patients_keyset_pagination(client):
+    """Pages follow next_cursor and do not overlap"""
+    ids = [
+        client.post("/api/patients/", json={
+            "name": f"Page Doe {i}",
+            "age": 30 + i,
+            "gender": "other",
+            "symptoms": "Fatigue",
+            "duration": "1 week"
+        }).json()["data"]["id"]
+        for i in range(3)
+    ]
+    
+    first = client.get("/api/patients/", params={"limit": 2, "after_id": ids[0] - 1}).json()
+    assert [p["id"] for p in first["data"]] == ids[:2]
+    assert first["next_cursor"] == ids[1]
+    
+    last = client.get("/api/patients/", params={"limit": 2, "after_id": first["next_cursor"]}).json()
+    assert [p["id"] for p in last["data"]] == ids[2:]
+    assert last["next_cursor"] is None
+    
+    # Only the paginated list carries a cursor
+    assert "next_cursor" not in client.get(f"/api/patients/{ids[0]}").json()
+
+def test_large_responses_are_gzipped(client):
+    """JSON lists are compressed but PDF exports are sent as-is"""
+    patient_id = client.post("/api/patients/", json={
+        "name": "Ada Moe",
+        "age": 67,
+        "gender": "female",
+        "symptoms": "Shortness of breath on exertion. " * 40,
+        "duration": "1 month"
+    }).json()["data"]["id"]
+    
+    headers = {"Accept-Encoding": "gzip"}
+    response = client.get("/api/patients/", headers=headers)
+    assert response.headers.get("content-encoding") == "gzip"
+    
+    pdf = client.get(f"/api/patients/{patient_id}/export/pdf", headers=headers)
+    assert "content-encoding" not in pdf.headers
+
+def test_get_patient_etag(client):
+    """A matching If-None-Match short-circuits to 304 until the patient changes"""
+    patient_id = client.post("/api/patients/", json={
+        "name": "Eve Tag",
+        "age": 38,
+        "gender": "female",
+        "symptoms": "Migraine",
+        "duration": "1 day"
+    }).json()["data"]["id"]
+    response = client.get(f"/api/patients/{patient_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    
+    cached = client.get(f"/api/patients/{patient_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    
+    async def update_patient():
+        async with TestingAsyncSessionLocal() as db, db.begin():
+            patient = await db.get(Patient, patient_id)
+            patient.symptoms = "Migraine and nausea"
+            # Explicit so the change is visible at SQLite's one-second resolution
+            patient.updated_at = patient.created_at + timedelta(seconds=1)
+    client.portal.call(update_patient)
+    
+    updated = client.get(f"/api/patients/{patient_id}", headers={"If-None-Match": etag})
+    assert updated.status_code == 200
+    assert updated.headers["etag"] != etag
+    assert updated.json()["data"]["symptoms"] == "Migraine and nausea"
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    """Create authenticated user for testing, once per session"""
     # Create admin user first
     client.post("/api/auth/create-admin")
     
@@ -74,10 +196,131 @@ def auth_headers():
     
     return {"Authorization": f"Bearer {token}"}
 
-def test_dashboard_stats(auth_headers):
+def test_dashboard_stats(client, auth_headers):
     """Test dashboard analytics"""
     response = client.get("/api/analytics/dashboard", headers=auth_headers)
     assert response.status_code == 200
     data = response.json()
     assert data["success"] is True
     assert "total_patients" in data["data"]
+
+def test_export_csv(client, auth_headers):
+    """Test analytics CSV export"""
+    client.post("/api/patients/", json={
+        "name": "Cal Doe",
+        "age": 29,
+        "gender": "male",
+        "symptoms": "Sore throat",
+        "duration": "2 days"
+    })
+    response = client.get("/api/analytics/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("ID,Name,Age")
+    # Rows come from the stream's own session, after the handler has returned
+    assert any(",Cal Doe," in line for line in lines[1:])
+
+def test_dashboard_stats_refresh_after_new_patient(client, auth_headers):
+    """Cached dashboard stats are dropped when a patient is created"""
+    before = client.get("/api/analytics/dashboard", headers=auth_headers).json()["data"]["total_patients"]
+    client.post("/api/patients/", json={
+        "name": "Jane Roe",
+        "age": 41,
+        "gender": "female",
+        "symptoms": "Cough",
+        "duration": "1 week"
+    })
+    after = client.get("/api/analytics/dashboard", headers=auth_headers).json()["data"]["total_patients"]
+    assert after == before + 1
+
+def test_logout_revokes_token(client, auth_headers):
+    """A token presented to /logout is rejected afterwards"""
+    login_data = {"username": "admin", "password": "admin123"}
+    token = client.post("/api/auth/login", json=login_data).json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+
+def test_revocation_check_is_cached_briefly(client, auth_headers):
+    """Live tokens skip the revoked_tokens query until the short TTL runs out"""
+    from app.routes import auth
+    login_data = {"username": "admin", "password": "admin123"}
+    token = client.post("/api/auth/login", json=login_data).json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    
+    # A logout handled by another worker only reaches the database
+    jti = jwt.decode(token, options={"verify_signature": False})["jti"]
+    async def revoke_elsewhere():
+        async with TestingAsyncSessionLocal() as db, db.begin():
+            db.add(RevokedToken(jti=jti, expires_at=datetime.utcnow() + timedelta(hours=1)))
+    client.portal.call(revoke_elsewhere)
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    
+    auth._unrevoked_cache.pop(jti)
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+def test_logout_ignores_unverified_tokens(client, auth_headers):
+    """Forged or expired tokens are not stored in the denylist"""
+    forged = jwt.encode({"sub": "admin", "jti": "forged"}, "wrong-key", algorithm="HS256")
+    expired = jwt.encode(
+        {"sub": "admin", "jti": "expired", "exp": 1}, settings.secret_key, algorithm=settings.algorithm
+    )
+    for token in (forged, expired, "not-a-jwt"):
+        response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+    
+    async def stored_jtis():
+        async with TestingAsyncSessionLocal() as db:
+            return set(await db.scalars(select(RevokedToken.jti)))
+    assert not {"forged", "expired"} & client.portal.call(stored_jtis)
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+
+def test_login_username_case_insensitive(client, auth_headers):
+    """Usernames are matched regardless of the casing typed at login"""
+    response = client.post("/api/auth/login", json={"username": "Admin", "password": "admin123"})
+    assert response.status_code == 200
+    assert response.json()["data"]["user"]["username"] == "admin"
+
+def test_login_matches_legacy_mixed_case_username(client):
+    """Usernames stored with capitals before normalisation can still log in"""
+    async def create_legacy_user():
+        # A Core insert skips the ORM validator, like rows written before it
+        async with TestingAsyncSessionLocal() as db, db.begin():
+            await db.execute(insert(DoctorUser).values(
+                username="DrLegacy",
+                email="legacy@medq.com",
+                hashed_password=get_password_hash("legacy123")
+            ))
+    client.portal.call(create_legacy_user)
+    
+    for username in ("DrLegacy", "drlegacy"):
+        response = client.post("/api/auth/login", json={"username": username, "password": "legacy123"})
+        assert response.status_code == 200
+        token = response.json()["data"]["token"]
+        assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+def test_pool_limits_split_connection_budget(monkeypatch, caplog):
+    from app.models import database
+    monkeypatch.setattr(database.settings, "db_max_connections", 90)
+    monkeypatch.setattr(database.settings, "db_pool_size", None)
+    monkeypatch.setattr(database.settings, "db_max_overflow", None)
+    
+    monkeypatch.setattr(database.settings, "web_concurrency", 9)
+    pool_size, max_overflow = database.get_pool_limits()
+    assert (pool_size + max_overflow) * 9 <= 90
+    assert not caplog.records
+    
+    # 65 workers no longer get a floor of two connections each (130 in all)
+    monkeypatch.setattr(database.settings, "web_concurrency", 65)
+    assert database.get_pool_limits() == (1, 0)
+    assert not caplog.records
+    
+    # More workers than connections still get one each, with a warning
+    monkeypatch.setattr(database.settings, "web_concurrency", 100)
+    assert database.get_pool_limits() == (1, 0)
+    assert "over DB_MAX_CONNECTIONS=90" in caplog.text